@@ -1,7 +1,14 @@
 import { PGlite } from '@electric-sql/pglite';
 import { writable, type Writable } from 'svelte/store';
 import type { Row } from '../types/row';
-import { getDB, initSchema, countRows, seedDb, getIssues } from '../utils/db';
+import {
+	getDB,
+	initSchema,
+	countRows,
+	seedDb,
+	getIssues,
+	applyDeltaPacks
+} from '../utils/db';
 import { vector } from '@electric-sql/pglite/vector';
 import { uuid_ossp } from '@electric-sql/pglite/contrib/uuid_ossp';
 
@@ -24,6 +31,10 @@ export async function setupFromScratch() {
 
 		if (count === 0) {
 			await seedDb(newDb);
+		} else if (!(await applyDeltaPacks(newDb))) {
+			// No delta chain from the local data version, so reload the latest snapshot
+			await newDb.exec('TRUNCATE TABLE page, issue CASCADE;');
+			await seedDb(newDb);
 		}
 
 		await updateIssuesAndContent(newDb);
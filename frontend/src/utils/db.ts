@@ -1,4 +1,4 @@
-import { PGlite } from '@electric-sql/pglite';
+import { PGlite, type Transaction } from '@electric-sql/pglite';
 import { vector } from '@electric-sql/pglite/vector';
 import type { Row } from '../types/row';
 import { uuid_ossp } from '@electric-sql/pglite/contrib/uuid_ossp';
@@ -53,9 +53,54 @@ export const initSchema = async (db: PGlite): Promise<void> => {
 
     CREATE INDEX IF NOT EXISTS page_fts_idx ON page USING gin(fts);
     CREATE INDEX IF NOT EXISTS page_embedding_idx ON page USING hnsw (embedding vector_ip_ops);
+
+    create table if not exists data_version (
+      id integer primary key default 1,
+      version integer not null
+    );
   `);
 };
 
+// Published data lives under /data; see processing/delta_packs.py for the layout.
+const DATA_PATH = '/data';
+
+type Manifest = {
+	latest: number;
+	snapshots: Array<{ version: number; issues: string; rows: string; bytes: number }>;
+	deltas: Array<{ from: number; to: number; path: string; bytes: number }>;
+};
+
+type DeltaSection<T> = { added: T[]; changed: T[]; deleted: string[] };
+
+type DeltaPack = {
+	from: number;
+	to: number;
+	issues: DeltaSection<any>;
+	pages: DeltaSection<Row>;
+};
+
+const fetchManifest = async (): Promise<Manifest | null> => {
+	try {
+		const response = await fetch(`${DATA_PATH}/manifest.json`);
+		return response.ok ? await response.json() : null;
+	} catch {
+		return null;
+	}
+};
+
+export const getDataVersion = async (db: PGlite): Promise<number | null> => {
+	const res = await db.query<{ version: number }>('SELECT version FROM data_version WHERE id = 1');
+	return res.rows.length ? res.rows[0].version : null;
+};
+
+const setDataVersion = async (db: PGlite | Transaction, version: number): Promise<void> => {
+	await db.query(
+		`INSERT INTO data_version (id, version) VALUES (1, $1)
+		ON CONFLICT (id) DO UPDATE SET version = EXCLUDED.version`,
+		[version]
+	);
+};
+
 // Helper method to count the rows in a table.
 export const countRows = async (db: PGlite, table: string): Promise<number> => {
 	const res = await db.query(`SELECT COUNT(*) FROM ${table};`);
@@ -64,8 +109,12 @@ export const countRows = async (db: PGlite, table: string): Promise<number> => {
 
 export const seedDb = async (db: PGlite): Promise<void> => {
 	console.log('seeindg DB');
+	// Prefer the latest versioned snapshot so later updates can be applied as deltas
+	const manifest = await fetchManifest();
+	const snapshot = manifest?.snapshots.find((entry) => entry.version === manifest.latest);
+
 	// First seed issues
-	const issuesResponse = await fetch('/issues.json');
+	const issuesResponse = await fetch(snapshot ? `${DATA_PATH}/${snapshot.issues}` : '/issues.json');
 	const issues = await issuesResponse.json();
 	console.log('Total issues in issues.json:', issues.length);
 
@@ -91,18 +140,19 @@ export const seedDb = async (db: PGlite): Promise<void> => {
 		);
 	}
 	// Then seed pages
-	const pagesResponse = await fetch('/rows.json');
+	const pagesResponse = await fetch(snapshot ? `${DATA_PATH}/${snapshot.rows}` : '/rows.json');
 	const rows = await pagesResponse.json();
 	console.log('Total pages in rows.json:', rows.length);
 
 	let insertedCount = 0;
 	for (const row of rows) {
-		const { parent_issue_id, page_number, ocr_result, embedding, image_url } = row;
+		const { id, parent_issue_id, page_number, ocr_result, embedding, image_url } = row;
 		if (parent_issue_id && page_number && ocr_result) {
+			// Keep published page ids so delta packs can update rows in place
 			await db.query(
-				`INSERT INTO page (parent_issue_id, page_number, ocr_result, embedding, image_url) 
-				VALUES ($1, $2, $3, $4, $5)`,
-				[parent_issue_id, page_number, ocr_result, embedding, image_url]
+				`INSERT INTO page (id, parent_issue_id, page_number, ocr_result, embedding, image_url) 
+				VALUES (COALESCE($1::uuid, uuid_generate_v4()), $2, $3, $4, $5, $6)`,
+				[id ?? null, parent_issue_id, page_number, ocr_result, embedding, image_url]
 			);
 			insertedCount++;
 		} else {
@@ -114,6 +164,130 @@ export const seedDb = async (db: PGlite): Promise<void> => {
 		}
 	}
 	console.log(`Inserted ${insertedCount} out of ${rows.length} rows into DB`);
+
+	if (snapshot) {
+		await setDataVersion(db, snapshot.version);
+	}
+};
+
+// Bring a seeded database up to the latest published version using delta packs.
+// Returns false when there's no delta chain from the local version (or it would be
+// bigger than the snapshot), in which case the caller should reseed instead.
+export const applyDeltaPacks = async (db: PGlite): Promise<boolean> => {
+	const manifest = await fetchManifest();
+	if (!manifest) {
+		return true;
+	}
+	const current = await getDataVersion(db);
+	if (current === manifest.latest) {
+		return true;
+	}
+	if (current === null) {
+		return false;
+	}
+
+	const chain: Manifest['deltas'] = [];
+	let version = current;
+	while (version !== manifest.latest) {
+		const step = manifest.deltas.find((delta) => delta.from === version);
+		if (!step) {
+			return false;
+		}
+		chain.push(step);
+		version = step.to;
+	}
+
+	const snapshot = manifest.snapshots.find((entry) => entry.version === manifest.latest);
+	const deltaBytes = chain.reduce((total, step) => total + step.bytes, 0);
+	if (snapshot && deltaBytes > snapshot.bytes) {
+		return false;
+	}
+
+	for (const step of chain) {
+		let delta: DeltaPack;
+		try {
+			const response = await fetch(`${DATA_PATH}/${step.path}`);
+			if (!response.ok) {
+				console.error(`Failed to fetch data delta ${step.path}: ${response.status}`);
+				return false;
+			}
+			delta = await response.json();
+		} catch (error) {
+			console.error(`Failed to fetch data delta ${step.path}:`, error);
+			return false;
+		}
+
+		await db.transaction(async (tx) => {
+			for (const id of delta.pages.deleted) {
+				await tx.query('DELETE FROM page WHERE id = $1', [id]);
+			}
+			for (const issue of [...delta.issues.added, ...delta.issues.changed]) {
+				await tx.query(
+					`INSERT INTO issue (
+						id, filename, created_at, num_pages, issue_url,
+						description, pdf_download, internet_archive, collection, pub_date
+					) VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10)
+					ON CONFLICT (id) DO UPDATE SET
+						filename = EXCLUDED.filename,
+						created_at = EXCLUDED.created_at,
+						num_pages = EXCLUDED.num_pages,
+						issue_url = EXCLUDED.issue_url,
+						description = EXCLUDED.description,
+						pdf_download = EXCLUDED.pdf_download,
+						internet_archive = EXCLUDED.internet_archive,
+						collection = EXCLUDED.collection,
+						pub_date = EXCLUDED.pub_date`,
+					[
+						issue.id,
+						issue.filename,
+						issue.created_at,
+						issue.num_pages,
+						issue.issue_url,
+						issue.description,
+						issue.pdf_download,
+						issue.internet_archive,
+						issue.collection,
+						issue.pub_date
+					]
+				);
+			}
+			for (const page of [...delta.pages.added, ...delta.pages.changed]) {
+				// Same rule as seedDb, so a delta-updated database matches a fresh seed
+				if (!(page.parent_issue_id && page.page_number && page.ocr_result)) {
+					await tx.query('DELETE FROM page WHERE id = $1', [page.id]);
+					continue;
+				}
+				await tx.query(
+					`INSERT INTO page (id, parent_issue_id, page_number, ocr_result, embedding, image_url)
+					VALUES ($1, $2, $3, $4, $5, $6)
+					ON CONFLICT (id) DO UPDATE SET
+						parent_issue_id = EXCLUDED.parent_issue_id,
+						page_number = EXCLUDED.page_number,
+						ocr_result = EXCLUDED.ocr_result,
+						embedding = EXCLUDED.embedding,
+						image_url = EXCLUDED.image_url`,
+					[
+						page.id,
+						page.parent_issue_id,
+						page.page_number,
+						page.ocr_result,
+						page.embedding,
+						page.image_url
+					]
+				);
+			}
+			for (const id of delta.issues.deleted) {
+				await tx.query('DELETE FROM issue WHERE id = $1', [id]);
+			}
+			await setDataVersion(tx, delta.to);
+		});
+		console.log(
+			`Applied data delta v${delta.from} -> v${delta.to}: ` +
+				`${delta.pages.added.length} added, ${delta.pages.changed.length} changed, ` +
+				`${delta.pages.deleted.length} deleted pages`
+		);
+	}
+	return true;
 };
 
 export const getTopTen = async (db: PGlite): Promise<Array<Row>> => {
@@ -0,0 +1,155 @@
+"""
+Two-tier resolution for OCR: render and transcribe each page at a low DPI
+first, and only re-render at the high DPI when the low-resolution result
+looks wrong. A result is escalated when
+
+  - the response was empty (or every attempt failed),
+  - the text is very short for the amount of ink on the page, or
+  - too many of its tokens aren't words from the vocabulary.
+
+The vocabulary is the system word list (if there is one) plus every word
+that appears at least VOCABULARY_MIN_COUNT times in the transcriptions held
+in the local mirror, so names and jargon from the catalogs count as words.
+
+Enable with OCR_ADAPTIVE_DPI=1; gemini_page_ocr reports per-tier counts and
+the pixels and bytes saved compared with rendering every page at HIGH_DPI.
+"""
+import io
+import os
+import re
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Optional, Set
+
+ADAPTIVE_DPI = os.getenv('OCR_ADAPTIVE_DPI', '0') == '1'
+LOW_DPI = int(os.getenv('OCR_LOW_DPI', '150'))
+HIGH_DPI = int(os.getenv('OCR_HIGH_DPI', '300'))
+# Characters of transcription expected per unit of ink coverage; a dense text page
+# around 8% ink transcribes to roughly 4000 characters
+MIN_CHARS_PER_INK = float(os.getenv('OCR_MIN_CHARS_PER_INK', '10000'))
+# Pages with less ink than this are too sparse for the length check to mean anything
+MIN_INK_FOR_LENGTH_CHECK = 0.01
+MAX_NON_DICTIONARY_RATIO = float(os.getenv('OCR_MAX_NON_DICTIONARY_RATIO', '0.35'))
+VOCABULARY_MIN_COUNT = 3
+JPEG_QUALITY = 90
+
+SYSTEM_WORD_LISTS = [Path('/usr/share/dict/words'), Path('/usr/dict/words')]
+TOKEN_PATTERN = re.compile(r"[^\W\d_]+(?:'[^\W\d_]+)?|\d+")
+
+_vocabulary: Optional[Set[str]] = None
+_vocabulary_lock = threading.Lock()
+
+def load_vocabulary() -> Set[str]:
+    """System word list plus frequent words from mirrored transcriptions, loaded once"""
+    global _vocabulary
+    with _vocabulary_lock:
+        if _vocabulary is not None:
+            return _vocabulary
+
+        words = set()
+        for path in SYSTEM_WORD_LISTS:
+            if path.exists():
+                with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+                    words.update(line.strip().lower() for line in f)
+                break
+
+        import mirror
+        if mirror.MIRROR_PATH.exists():
+            conn = mirror.connect()
+            counts = Counter()
+            for (text,) in conn.execute("select ocr_result from page where not error"):
+                counts.update(token.lower() for token in TOKEN_PATTERN.findall(text or ''))
+            conn.close()
+            words.update(word for word, count in counts.items() if count >= VOCABULARY_MIN_COUNT)
+
+        _vocabulary = words
+        return _vocabulary
+
+def non_dictionary_ratio(text: str, vocabulary: Set[str]) -> float:
+    """Fraction of tokens that are neither numbers nor vocabulary words"""
+    tokens = TOKEN_PATTERN.findall(text)
+    if not tokens:
+        return 1.0
+    unknown = sum(1 for token in tokens if not token.isdigit() and token.lower() not in vocabulary)
+    return unknown / len(tokens)
+
+def escalation_reason(text: Optional[str], ink: float, vocabulary: Set[str]) -> Optional[str]:
+    """Why a low-DPI transcription should be redone at high DPI, or None if it looks fine"""
+    if not text or not text.strip():
+        return 'empty'
+    if ink >= MIN_INK_FOR_LENGTH_CHECK and len(text) < ink * MIN_CHARS_PER_INK:
+        return 'short'
+    # Without any vocabulary every token would count as unknown
+    if vocabulary and non_dictionary_ratio(text, vocabulary) > MAX_NON_DICTIONARY_RATIO:
+        return 'non-dictionary'
+    return None
+
+def encode_image(image) -> bytes:
+    """JPEG bytes of a rendered page, as sent to the model"""
+    buffer = io.BytesIO()
+    image.convert('RGB').save(buffer, 'JPEG', quality=JPEG_QUALITY)
+    return buffer.getvalue()
+
+class TierStats:
+    """Thread-safe counters for the two tiers"""
+
+    def __init__(self, low_dpi: int = LOW_DPI, high_dpi: int = HIGH_DPI):
+        self.low_dpi = low_dpi
+        self.high_dpi = high_dpi
+        self._lock = threading.Lock()
+        self.pages = 0
+        self.escalations: Counter = Counter()
+        # Escalated pages whose high-DPI render or request failed and kept the low-DPI text
+        self.fallbacks = 0
+        self.pixels = 0
+        self.bytes_sent = 0
+        # What rendering every page at high_dpi would have cost
+        self.baseline_pixels = 0
+        self.baseline_bytes = 0
+
+    def record(self, low_pixels: int, low_bytes: int, high_pixels: int = 0, high_bytes: int = 0,
+               reason: Optional[str] = None, fell_back: bool = False):
+        scale = (self.high_dpi / self.low_dpi) ** 2
+        with self._lock:
+            self.pages += 1
+            self.fallbacks += fell_back
+            self.pixels += low_pixels + high_pixels
+            self.bytes_sent += low_bytes + high_bytes
+            if reason:
+                self.escalations[reason] += 1
+            if high_pixels:
+                self.baseline_pixels += high_pixels
+                self.baseline_bytes += high_bytes
+            else:
+                # Not rendered at high DPI; JPEG size grows roughly with pixel count
+                self.baseline_pixels += int(low_pixels * scale)
+                self.baseline_bytes += int(low_bytes * scale)
+
+    def summary(self) -> Dict[str, object]:
+        with self._lock:
+            escalated = sum(self.escalations.values())
+            return {
+                'pages': self.pages,
+                'low_only': self.pages - escalated,
+                'escalated': escalated,
+                'escalations': dict(self.escalations),
+                'fallbacks': self.fallbacks,
+                'pixels': self.pixels,
+                'bytes_sent': self.bytes_sent,
+                'pixel_reduction': 1 - self.pixels / self.baseline_pixels if self.baseline_pixels else 0.0,
+                'byte_reduction': 1 - self.bytes_sent / self.baseline_bytes if self.baseline_bytes else 0.0,
+            }
+
+    def report(self) -> str:
+        summary = self.summary()
+        if not summary['pages']:
+            return "No pages processed"
+        reasons = ', '.join(f"{count} {reason}" for reason, count in sorted(summary['escalations'].items()))
+        fallbacks = f", {summary['fallbacks']} kept the low-DPI text after a failed retry" if summary['fallbacks'] else ''
+        return (
+            f"{summary['low_only']} pages at {self.low_dpi} DPI, {summary['escalated']} escalated to "
+            f"{self.high_dpi} DPI{f' ({reasons})' if reasons else ''}{fallbacks}; "
+            f"{summary['pixel_reduction']:.1%} fewer pixels rendered, "
+            f"~{summary['byte_reduction']:.1%} fewer bytes sent than all pages at {self.high_dpi} DPI"
+        )
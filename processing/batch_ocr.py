@@ -0,0 +1,511 @@
+"""
+Batch-job OCR for bulk backfills.
+
+    python batch_ocr.py prepare [--directory WECs] [--dpi 300] [--max-requests 500]
+    python batch_ocr.py run [--backend gemini|local] [--poll-interval 60] [--no-wait]
+    python batch_ocr.py status
+    python batch_ocr.py compare [--online-json loadtest.json | --online-pages-per-second N]
+
+Instead of one synchronous generate_content call per page, `prepare` renders
+every page that isn't in the `page` table yet and writes it, with the same
+prompt gemini_page_ocr uses, as one line of a JSONL job file:
+
+    {"key": "<filename>:<page>", "request": {"contents": [{"parts": [
+        {"text": "<prompt>"}, {"inline_data": {"mime_type": "image/jpeg", "data": "<base64>"}}]}]}}
+
+`run` takes every unfinished job through submit -> poll -> download -> ingest,
+inserting the results into `page` in chunks. Each job keeps its state in
+batch-jobs/<job>/job.json and is saved after every step, so an interrupted
+run picks up where it stopped; ingesting skips pages already stored, so it is
+safe to repeat. Blank and duplicate pages found by page_dedup.py are stored
+during `prepare` and never enter a job.
+
+Backends:
+
+  gemini   Gemini Batch Mode through the google-genai SDK: the job file is
+           uploaded, run asynchronously at the batch price and downloaded.
+           Needs google-genai 1.24 or later for `client.batches` on the
+           Gemini API.
+  local    Runs each request through gemini_page_ocr's model itself and
+           writes a result file in the batch output format. Under
+           `python loadtest.py batch` that model is the fake, so the whole
+           flow runs offline.
+
+`compare` estimates the tokens and cost of the ingested jobs at the online
+and batch prices and sets their end-to-end throughput against the online
+path's, taken from a loadtest --json file or given directly.
+
+gemini_page_ocr creates its Gemini and Supabase clients at import time, so it
+is only imported by the commands that need it; `status` and `compare` work
+from the job files alone.
+"""
+import argparse
+import base64
+import json
+import math
+import os
+import shutil
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import PyPDF2
+
+import adaptive_ocr
+
+JOBS_DIR = Path("batch-jobs")
+BATCH_MODEL = os.getenv('OCR_BATCH_MODEL', 'models/gemini-2.0-flash')
+MAX_JOB_REQUESTS = 500
+# The Batch API accepts input files up to 2 GB
+MAX_JOB_BYTES = 1_000_000_000
+INSERT_CHUNK = 500
+# Pages rendered, or requests run by the local backend, in parallel
+MAX_WORKERS = int(os.getenv('OCR_MAX_WORKERS', '10'))
+
+# Gemini 2.0 Flash list prices in USD per million tokens; batch jobs cost half
+INPUT_PRICE = 0.10
+OUTPUT_PRICE = 0.40
+BATCH_DISCOUNT = 0.5
+# Images are billed in 768x768 tiles of 258 tokens each
+IMAGE_TILE = 768
+TOKENS_PER_TILE = 258
+CHARS_PER_TOKEN = 4
+
+def load_ocr():
+    """gemini_page_ocr, imported on first use"""
+    import gemini_page_ocr
+    return gemini_page_ocr
+
+# --- Job state --------------------------------------------------------------
+
+def _now() -> float:
+    return time.time()
+
+def save_job(job: dict):
+    path = JOBS_DIR / job['id'] / 'job.json'
+    tmp_path = path.with_suffix('.tmp')
+    tmp_path.write_text(json.dumps(job, indent=2))
+    tmp_path.replace(path)
+
+def load_jobs() -> List[dict]:
+    """Every job, oldest first"""
+    if not JOBS_DIR.exists():
+        return []
+    return [json.loads(path.read_text()) for path in sorted(JOBS_DIR.glob('job-*/job.json'))]
+
+def _new_job(jobs: List[dict]) -> dict:
+    number = max((int(job['id'].split('-')[1]) for job in jobs), default=0) + 1
+    job = {
+        'id': f"job-{number:04d}",
+        'status': 'preparing',
+        'backend': None,
+        'backend_name': None,
+        'issues': {},
+        'requests': 0,
+        'bytes': 0,
+        'input_tokens': 0,
+        'prepared_at': None,
+        'submitted_at': None,
+        'completed_at': None,
+        'ingested_at': None,
+        'ingested': 0,
+        'errors': 0,
+        'missing': 0,
+    }
+    (JOBS_DIR / job['id']).mkdir(parents=True, exist_ok=True)
+    jobs.append(job)
+    return job
+
+def _queued_pages(jobs: List[dict]) -> set:
+    """(filename, page) of every page waiting in a job that can still deliver it"""
+    queued = set()
+    for job in jobs:
+        if job['status'] in ('prepared', 'submitted', 'succeeded'):
+            with open(JOBS_DIR / job['id'] / 'requests.jsonl', 'r', encoding='utf-8') as requests_file:
+                for line in requests_file:
+                    filename, page_num = json.loads(line)['key'].rsplit(':', 1)
+                    queued.add((filename, int(page_num)))
+    return queued
+
+# --- Prepare ----------------------------------------------------------------
+
+def image_tokens(width: int, height: int) -> int:
+    return math.ceil(width / IMAGE_TILE) * math.ceil(height / IMAGE_TILE) * TOKENS_PER_TILE
+
+def _request_line(pdf_path: Path, page_num: int, dpi: int) -> Optional[tuple]:
+    """(JSONL line, estimated input tokens) for one page, or None if it didn't render"""
+    ocr = load_ocr()
+    image = ocr.render_page(str(pdf_path), page_num, dpi)
+    if image is None:
+        return None
+    tokens = image_tokens(image.width, image.height) + len(ocr.OCR_PROMPT) // CHARS_PER_TOKEN
+    jpeg = adaptive_ocr.encode_image(image)
+    image.close()
+    line = json.dumps({
+        'key': f"{pdf_path.name}:{page_num}",
+        'request': {'contents': [{'parts': [
+            {'text': ocr.OCR_PROMPT},
+            {'inline_data': {'mime_type': 'image/jpeg', 'data': base64.b64encode(jpeg).decode('ascii')}},
+        ]}]},
+    }) + '\n'
+    return line, tokens
+
+def prepare(directory: str = "WECs", dpi: int = adaptive_ocr.HIGH_DPI,
+            max_requests: int = MAX_JOB_REQUESTS, max_bytes: int = MAX_JOB_BYTES) -> List[dict]:
+    """Write job files for every page not yet in the database or an open job; returns the new jobs"""
+    ocr = load_ocr()
+    jobs = load_jobs()
+    queued = _queued_pages(jobs)
+    new_jobs = []
+    job = None
+    requests_file = None
+
+    def finish(job, requests_file):
+        requests_file.close()
+        job['status'] = 'prepared'
+        job['prepared_at'] = _now()
+        save_job(job)
+        print(f"Prepared {job['id']}: {job['requests']} pages, {job['bytes'] / 1e6:.1f} MB")
+
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        for pdf_path in sorted(Path(directory).glob("*.pdf")):
+            filename = pdf_path.name
+            with open(pdf_path, 'rb') as pdf_file:
+                pdf_page_count = len(PyPDF2.PdfReader(pdf_file).pages)
+            issue_id = ocr.get_issue_id(filename)
+            processed_pages = ocr.get_processed_pages(issue_id)
+            pages = [
+                page_num for page_num in range(1, pdf_page_count + 1)
+                if str(page_num) not in processed_pages and (filename, page_num) not in queued
+                and not ocr.reuse_transcription(page_num, filename, issue_id)
+            ]
+            if not pages:
+                continue
+
+            # Render in parallel, write in page order
+            rendered_pages = executor.map(lambda page_num: _request_line(pdf_path, page_num, dpi), pages)
+            for page_num, rendered in zip(pages, rendered_pages):
+                if rendered is None:
+                    print(f"Failed to convert {filename} page {page_num}")
+                    continue
+                line, tokens = rendered
+                size = len(line.encode('utf-8'))
+                if job and (job['requests'] >= max_requests or job['bytes'] + size > max_bytes):
+                    finish(job, requests_file)
+                    job = None
+                if job is None:
+                    job = _new_job(jobs)
+                    new_jobs.append(job)
+                    requests_file = open(JOBS_DIR / job['id'] / 'requests.jsonl', 'w', encoding='utf-8')
+                requests_file.write(line)
+                job['issues'][filename] = issue_id
+                job['requests'] += 1
+                job['bytes'] += size
+                job['input_tokens'] += tokens
+
+    if job:
+        finish(job, requests_file)
+    if not new_jobs:
+        print("Nothing to prepare")
+    return new_jobs
+
+# --- Backends ---------------------------------------------------------------
+
+class BatchBackend(ABC):
+    """Submits JSONL job files and fetches their results"""
+
+    name = None
+
+    @abstractmethod
+    def submit(self, requests_path: Path, display_name: str) -> str:
+        """Start a job; returns the backend's name for it"""
+
+    @abstractmethod
+    def poll(self, backend_name: str) -> str:
+        """'running', 'succeeded' or 'failed'"""
+
+    @abstractmethod
+    def download(self, backend_name: str, results_path: Path):
+        """Write the job's JSONL results to results_path"""
+
+class GeminiBatchBackend(BatchBackend):
+    """Gemini Batch Mode via google-genai"""
+
+    name = 'gemini'
+    FAILED_STATES = {'JOB_STATE_FAILED', 'JOB_STATE_CANCELLED', 'JOB_STATE_EXPIRED'}
+
+    def __init__(self, model: str = BATCH_MODEL):
+        from google import genai
+        self.client = genai.Client(api_key=os.getenv('GOOGLE_API_KEY'))
+        self.model = model
+
+    def submit(self, requests_path: Path, display_name: str) -> str:
+        uploaded = self.client.files.upload(
+            file=str(requests_path),
+            config={'display_name': display_name, 'mime_type': 'jsonl'},
+        )
+        job = self.client.batches.create(model=self.model, src=uploaded.name,
+                                         config={'display_name': display_name})
+        return job.name
+
+    def poll(self, backend_name: str) -> str:
+        state = self.client.batches.get(name=backend_name).state.name
+        if state == 'JOB_STATE_SUCCEEDED':
+            return 'succeeded'
+        if state in self.FAILED_STATES:
+            return 'failed'
+        return 'running'
+
+    def download(self, backend_name: str, results_path: Path):
+        job = self.client.batches.get(name=backend_name)
+        results_path.write_bytes(self.client.files.download(file=job.dest.file_name))
+
+class LocalBatchBackend(BatchBackend):
+    """Runs a job file through gemini_page_ocr's model on this machine"""
+
+    name = 'local'
+
+    def __init__(self, root: Path = JOBS_DIR / 'local', max_workers: int = MAX_WORKERS):
+        self.root = root
+        self.max_workers = max_workers
+
+    def submit(self, requests_path: Path, display_name: str) -> str:
+        job_dir = self.root / display_name
+        job_dir.mkdir(parents=True, exist_ok=True)
+        (job_dir / 'source').write_text(str(requests_path.resolve()))
+        return display_name
+
+    def _run_request(self, line: str) -> str:
+        entry = json.loads(line)
+        # transcribe() adds the same prompt the job file carries
+        inline_data = next(part['inline_data'] for part in entry['request']['contents'][0]['parts']
+                           if 'inline_data' in part)
+        text, error = load_ocr().transcribe({'mime_type': inline_data['mime_type'],
+                                             'data': base64.b64decode(inline_data['data'])})
+        if error:
+            return json.dumps({'key': entry['key'], 'error': {'message': error}}) + '\n'
+        return json.dumps({'key': entry['key'], 'response': {
+            'candidates': [{'content': {'parts': [{'text': text}]}}],
+        }}) + '\n'
+
+    def poll(self, backend_name: str) -> str:
+        job_dir = self.root / backend_name
+        results_path = job_dir / 'results.jsonl'
+        if not results_path.exists():
+            # The whole job runs on the first poll; results only appear once it is complete
+            requests_path = Path((job_dir / 'source').read_text())
+            tmp_path = results_path.with_suffix('.tmp')
+            with open(requests_path, 'r', encoding='utf-8') as requests_file, \
+                 open(tmp_path, 'w', encoding='utf-8') as results_file, \
+                 ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                for result in executor.map(self._run_request, requests_file):
+                    results_file.write(result)
+            tmp_path.replace(results_path)
+        return 'succeeded'
+
+    def download(self, backend_name: str, results_path: Path):
+        shutil.copyfile(self.root / backend_name / 'results.jsonl', results_path)
+
+BACKENDS = {'gemini': GeminiBatchBackend, 'local': LocalBatchBackend}
+
+# --- Ingest -----------------------------------------------------------------
+
+def response_text(result: dict):
+    """(text, error, usage) from one line of batch output"""
+    if 'error' in result or 'status' in result:
+        error = result.get('error') or result.get('status')
+        return None, error.get('message', json.dumps(error)), {}
+    response = result.get('response', {})
+    usage = response.get('usageMetadata', {})
+    candidates = response.get('candidates') or []
+    if not candidates:
+        reason = response.get('promptFeedback', {}).get('blockReason', 'no candidates')
+        return None, f"Empty response ({reason})", usage
+    parts = candidates[0].get('content', {}).get('parts', [])
+    return ''.join(part.get('text', '') for part in parts), None, usage
+
+def ingest(job: dict) -> dict:
+    """Insert a downloaded job's results into `page`, skipping pages already stored"""
+    ocr = load_ocr()
+    processed = {filename: ocr.get_processed_pages(issue_id) for filename, issue_id in job['issues'].items()}
+    rows = []
+    seen = set()
+    output_tokens = 0
+    job['errors'] = 0
+    with open(JOBS_DIR / job['id'] / 'results.jsonl', 'r', encoding='utf-8') as results_file:
+        for line in results_file:
+            if not line.strip():
+                continue
+            result = json.loads(line)
+            filename, page_num = result['key'].rsplit(':', 1)
+            seen.add(result['key'])
+            text, error, usage = response_text(result)
+            output_tokens += usage.get('candidatesTokenCount', len(text or '') // CHARS_PER_TOKEN)
+            job['errors'] += bool(error)
+            if page_num in processed[filename]:
+                continue
+            rows.append({
+                'parent_issue_id': job['issues'][filename],
+                'page_number': page_num,
+                'ocr_result': f"ERROR: {error}" if error else text,
+                'error': bool(error),
+            })
+
+    for start in range(0, len(rows), INSERT_CHUNK):
+        ocr.supabase.table('page').insert(rows[start:start + INSERT_CHUNK]).execute()
+
+    # Pages without a result aren't stored, so the next `prepare` queues them again
+    job['missing'] = job['requests'] - len(seen)
+    job['ingested'] += len(rows)
+    job['output_tokens'] = output_tokens
+    job['status'] = 'ingested'
+    job['ingested_at'] = _now()
+    save_job(job)
+    print(f"Ingested {job['id']}: {len(rows)} pages, {job['errors']} errors, {job['missing']} missing")
+    return job
+
+# --- Run --------------------------------------------------------------------
+
+def advance(job: dict, backends: Dict[str, BatchBackend]) -> bool:
+    """Take a job as far as it can go without waiting; returns True once it is finished"""
+    job_dir = JOBS_DIR / job['id']
+    if job['status'] == 'prepared':
+        backend = backends[job['backend']]
+        job['backend_name'] = backend.submit(job_dir / 'requests.jsonl', job['id'])
+        job['status'] = 'submitted'
+        job['submitted_at'] = _now()
+        save_job(job)
+        print(f"Submitted {job['id']} to {job['backend']} as {job['backend_name']}")
+    if job['status'] == 'submitted':
+        state = backends[job['backend']].poll(job['backend_name'])
+        if state == 'running':
+            return False
+        if state == 'failed':
+            job['status'] = 'failed'
+            save_job(job)
+            print(f"✗ {job['id']} failed; its pages will be prepared again")
+            return True
+        backends[job['backend']].download(job['backend_name'], job_dir / 'results.jsonl')
+        job['status'] = 'succeeded'
+        job['completed_at'] = _now()
+        save_job(job)
+    if job['status'] == 'succeeded':
+        ingest(job)
+    return True
+
+def run(backend: str = 'gemini', poll_interval: float = 60, wait: bool = True):
+    """Submit, poll and ingest every unfinished job"""
+    backends = {}
+    while True:
+        pending = [job for job in load_jobs() if job['status'] in ('prepared', 'submitted', 'succeeded')]
+        if not pending:
+            print("No unfinished jobs")
+            return
+        waiting = 0
+        for job in pending:
+            # Jobs keep the backend they were submitted to
+            if job['status'] == 'prepared' and job['backend'] is None:
+                job['backend'] = backend
+            if job['backend'] not in backends:
+                backends[job['backend']] = BACKENDS[job['backend']]()
+            if not advance(job, backends):
+                waiting += 1
+        if not waiting or not wait:
+            if waiting:
+                print(f"{waiting} jobs still running")
+            return
+        print(f"{waiting} jobs still running, checking again in {poll_interval:g}s")
+        time.sleep(poll_interval)
+
+# --- Reports ----------------------------------------------------------------
+
+def show_status():
+    jobs = load_jobs()
+    if not jobs:
+        print("No batch jobs")
+        return
+    print(f"{'job':<10} {'backend':<8} {'status':<10} {'pages':>6} {'MB':>8} {'ingested':>9} {'errors':>7}")
+    for job in jobs:
+        print(f"{job['id']:<10} {job['backend'] or '-':<8} {job['status']:<10} {job['requests']:>6} "
+              f"{job['bytes'] / 1e6:>8.1f} {job['ingested']:>9} {job['errors']:>7}")
+
+def compare(online_pages_per_second: Optional[float] = None, input_price: float = INPUT_PRICE,
+            output_price: float = OUTPUT_PRICE, batch_discount: float = BATCH_DISCOUNT) -> dict:
+    """Cost and throughput of the ingested jobs against OCRing the same pages online"""
+    jobs = [job for job in load_jobs() if job['status'] == 'ingested']
+    if not jobs:
+        print("No ingested jobs to compare")
+        return {}
+
+    pages = sum(job['requests'] for job in jobs)
+    input_tokens = sum(job['input_tokens'] for job in jobs)
+    output_tokens = sum(job.get('output_tokens', 0) for job in jobs)
+    online_cost = (input_tokens * input_price + output_tokens * output_price) / 1e6
+    batch_cost = online_cost * (1 - batch_discount)
+    # From the start of the first job to the end of the last, queueing included
+    elapsed = max(job['ingested_at'] for job in jobs) - min(job['submitted_at'] for job in jobs)
+    batch_rate = pages / elapsed if elapsed > 0 else None
+
+    print(f"{len(jobs)} ingested jobs, {pages} pages, ~{input_tokens:,} input and ~{output_tokens:,} output tokens")
+    print(f"Cost online: ${online_cost:.2f} (${online_cost / pages * 1000:.2f} per 1000 pages)")
+    print(f"Cost batch:  ${batch_cost:.2f} (${batch_cost / pages * 1000:.2f} per 1000 pages), "
+          f"saving ${online_cost - batch_cost:.2f}")
+    if batch_rate:
+        print(f"Throughput batch:  {batch_rate * 3600:,.0f} pages/hour over {elapsed:,.0f}s")
+    if online_pages_per_second:
+        print(f"Throughput online: {online_pages_per_second * 3600:,.0f} pages/hour "
+              f"({pages / online_pages_per_second:,.0f}s for these pages)")
+        if batch_rate:
+            print(f"Batch runs at {batch_rate / online_pages_per_second:.2f}x the online rate")
+    return {
+        'pages': pages,
+        'input_tokens': input_tokens,
+        'output_tokens': output_tokens,
+        'online_cost': online_cost,
+        'batch_cost': batch_cost,
+        'batch_pages_per_second': batch_rate,
+        'online_pages_per_second': online_pages_per_second,
+    }
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Batch-job OCR for bulk backfills")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    prepare_parser = subparsers.add_parser('prepare', help="write job files for pages not yet OCR'd")
+    prepare_parser.add_argument('--directory', default="WECs")
+    prepare_parser.add_argument('--dpi', type=int, default=adaptive_ocr.HIGH_DPI)
+    prepare_parser.add_argument('--max-requests', type=int, default=MAX_JOB_REQUESTS)
+
+    run_parser = subparsers.add_parser('run', help="submit, poll and ingest unfinished jobs")
+    run_parser.add_argument('--backend', choices=sorted(BACKENDS), default=os.getenv('OCR_BATCH_BACKEND', 'gemini'))
+    run_parser.add_argument('--poll-interval', type=float, default=60)
+    run_parser.add_argument('--no-wait', action='store_true', help="poll once instead of waiting for every job")
+
+    subparsers.add_parser('status', help="list jobs")
+
+    compare_parser = subparsers.add_parser('compare', help="cost and throughput against the online path")
+    online = compare_parser.add_mutually_exclusive_group()
+    online.add_argument('--online-json', type=Path, help="`loadtest.py ocr --json` output to take the online rate from")
+    online.add_argument('--online-pages-per-second', type=float)
+    compare_parser.add_argument('--input-price', type=float, default=INPUT_PRICE, help="USD per million tokens")
+    compare_parser.add_argument('--output-price', type=float, default=OUTPUT_PRICE, help="USD per million tokens")
+    compare_parser.add_argument('--batch-discount', type=float, default=BATCH_DISCOUNT)
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'prepare':
+        prepare(args.directory, args.dpi, args.max_requests)
+    elif args.command == 'run':
+        run(args.backend, args.poll_interval, not args.no_wait)
+    elif args.command == 'status':
+        show_status()
+    elif args.command == 'compare':
+        rate = args.online_pages_per_second
+        if args.online_json:
+            rate = json.loads(args.online_json.read_text())['throughput_per_second']
+        compare(rate, args.input_price, args.output_price, args.batch_discount)
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,7 @@ from pathlib import Path
 from supabase import create_client, Client
 from dotenv import load_dotenv
 import PyPDF2
+import mirror
 
 # Load environment variables and initialize Supabase client
 load_dotenv()
@@ -15,20 +16,13 @@ def check_page_counts():
     """
     Compare page counts between PDFs and database records
     """
-    # Get all issues
-    issues = supabase.table('issue').select('*').execute()
+    # Pull new rows into the local mirror, then count every issue's pages in one query
+    conn = mirror.sync(supabase)
     
-    for issue in issues.data:
+    for issue in mirror.issue_page_counts(conn):
         issue_id = issue['id']
         filename = issue['filename']
-        
-        # Get count of pages in database for this issue
-        pages = supabase.table('page')\
-            .select('id')\
-            .eq('parent_issue_id', issue_id)\
-            .execute()
-        
-        db_page_count = len(pages.data)
+        db_page_count = issue['db_page_count']
         
         # Get/set PDF page count from issue record
         if issue['num_pages'] is None:
@@ -46,6 +40,7 @@ def check_page_counts():
             supabase.table('issue').update({'num_pages': pdf_page_count})\
                 .eq('id', issue_id)\
                 .execute()
+            mirror.update_issue(conn, issue_id, num_pages=pdf_page_count)
         else:
             pdf_page_count = issue['num_pages']
         
@@ -0,0 +1,266 @@
+"""
+Versioned data snapshots and delta packs for the frontend.
+
+    python delta_packs.py build [--rows rows.json --issues issues.json] [--out ../frontend/static/data]
+    python delta_packs.py verify [--out ../frontend/static/data] [--history data-history]
+
+Every build that changes anything publishes a new version:
+
+    manifest.json                 latest version, its snapshot and every delta with their sizes
+    snapshots/v{N}/issues.json    full issue table
+    snapshots/v{N}/rows.json      full page table (same shape as the old rows.json, plus id)
+    snapshots/v{N}/hashes.json    content hash of every issue and page, keyed by id
+    deltas/v{N-1}-v{N}.json       added, changed and deleted issues and pages
+
+A client holding version N applies deltas N -> N+1 -> ... -> latest instead
+of downloading the full snapshot again. Rows are compared by id and a hash of
+their content, so re-OCR'd text, new embeddings or image URLs show up as
+changed pages. Pages the client wouldn't load (no text, e.g. blank pages) are
+left out of snapshots, so a page that loses its text is a deleted page.
+
+Each new delta is checked by applying it to the previous snapshot and
+comparing the result with the new one before the manifest is updated. Only
+the latest snapshot is published; older ones move to --history (outside the
+static site, so they aren't deployed), where the newest --keep are kept for
+`verify`. Deltas are kept so any client can still catch up.
+"""
+import argparse
+import hashlib
+import json
+import shutil
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+DEFAULT_OUT = Path(__file__).resolve().parent.parent / 'frontend' / 'static' / 'data'
+DEFAULT_HISTORY = Path(__file__).resolve().parent / 'data-history'
+PAGE_SIZE = 1000
+
+ISSUE_COLUMNS = [
+    'id', 'filename', 'created_at', 'num_pages', 'issue_url', 'description',
+    'pdf_download', 'internet_archive', 'collection', 'pub_date',
+]
+PAGE_COLUMNS = ['id', 'parent_issue_id', 'page_number', 'ocr_result', 'embedding', 'image_url', 'created_at']
+
+def content_hash(row: dict) -> str:
+    return hashlib.sha256(json.dumps(row, sort_keys=True, separators=(',', ':')).encode('utf-8')).hexdigest()[:16]
+
+def _write_json(path: Path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix('.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, separators=(',', ':'))
+    tmp_path.replace(path)
+
+def _read_json(path: Path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def fetch_tables() -> Dict[str, List[dict]]:
+    """Issue and non-error page rows from Supabase, read in keyset pages by id"""
+    from mirror import create_supabase_client
+    supabase = create_supabase_client()
+
+    def fetch_all(table, columns, only_valid):
+        rows = []
+        last_id = None
+        while True:
+            query = supabase.table(table).select(', '.join(columns)).order('id').limit(PAGE_SIZE)
+            if only_valid:
+                query = query.eq('error', False)
+            if last_id is not None:
+                query = query.gt('id', last_id)
+            batch = query.execute().data
+            rows.extend(batch)
+            if len(batch) < PAGE_SIZE:
+                return rows
+            last_id = batch[-1]['id']
+
+    return {
+        'issues': fetch_all('issue', ISSUE_COLUMNS, only_valid=False),
+        'pages': fetch_all('page', PAGE_COLUMNS, only_valid=True),
+    }
+
+def client_loads(page: dict) -> bool:
+    """Whether the frontend's seedDb would insert this page"""
+    return bool(page.get('parent_issue_id') and page.get('page_number') and page.get('ocr_result'))
+
+def diff(old: Dict[str, dict], new: Dict[str, dict], old_hashes: Dict[str, str], new_hashes: Dict[str, str]) -> dict:
+    """Added, changed and deleted rows between two {id: row} tables"""
+    return {
+        'added': [new[row_id] for row_id in new if row_id not in old_hashes],
+        'changed': [new[row_id] for row_id in new if row_id in old_hashes and old_hashes[row_id] != new_hashes[row_id]],
+        'deleted': [row_id for row_id in old_hashes if row_id not in new],
+    }
+
+def apply_delta(issues: Dict[str, dict], pages: Dict[str, dict], delta: dict):
+    """Apply a delta in place to {id: row} tables, the same way the client does"""
+    for table, section in ((issues, delta['issues']), (pages, delta['pages'])):
+        for row_id in section['deleted']:
+            table.pop(row_id, None)
+        for row in section['added'] + section['changed']:
+            table[row['id']] = row
+
+def load_manifest(out_dir: Path) -> dict:
+    path = out_dir / 'manifest.json'
+    if path.exists():
+        return _read_json(path)
+    return {'latest': None, 'snapshots': [], 'deltas': []}
+
+def load_snapshot(out_dir: Path, version: int):
+    snapshot_dir = out_dir / 'snapshots' / f"v{version}"
+    issues = {row['id']: row for row in _read_json(snapshot_dir / 'issues.json')}
+    pages = {row['id']: row for row in _read_json(snapshot_dir / 'rows.json')}
+    return issues, pages
+
+def _hashes(rows: Dict[str, dict]) -> Dict[str, str]:
+    return {row_id: content_hash(row) for row_id, row in rows.items()}
+
+def build(tables: Dict[str, List[dict]], out_dir: Path, keep: int = 5,
+          history_dir: Path = DEFAULT_HISTORY) -> Optional[int]:
+    """Publish a new version if the tables changed; returns the new version or None"""
+    if any('id' not in row for rows in tables.values() for row in rows):
+        raise ValueError("Every issue and page row needs an id to be diffed between versions")
+    issues = {row['id']: row for row in tables['issues']}
+    pages = {row['id']: row for row in tables['pages'] if client_loads(row)}
+    hashes = {'issues': _hashes(issues), 'pages': _hashes(pages)}
+
+    manifest = load_manifest(out_dir)
+    previous = manifest['latest']
+    version = 1 if previous is None else previous + 1
+
+    delta = None
+    if previous is not None:
+        old_hashes = _read_json(out_dir / 'snapshots' / f"v{previous}" / 'hashes.json')
+        old_issues, old_pages = load_snapshot(out_dir, previous)
+        delta = {
+            'from': previous,
+            'to': version,
+            'issues': diff(old_issues, issues, old_hashes['issues'], hashes['issues']),
+            'pages': diff(old_pages, pages, old_hashes['pages'], hashes['pages']),
+        }
+        if not any(delta[table][kind] for table in ('issues', 'pages') for kind in ('added', 'changed', 'deleted')):
+            print(f"No changes since v{previous}")
+            return None
+
+        # The delta must turn the previous snapshot into exactly this one
+        apply_delta(old_issues, old_pages, delta)
+        if _hashes(old_issues) != hashes['issues'] or _hashes(old_pages) != hashes['pages']:
+            raise RuntimeError(f"Delta v{previous}-v{version} does not reproduce the new snapshot")
+
+    snapshot_dir = out_dir / 'snapshots' / f"v{version}"
+    ordered_issues = sorted(issues.values(), key=lambda row: row['id'])
+    ordered_pages = sorted(pages.values(), key=lambda row: row['id'])
+    _write_json(snapshot_dir / 'issues.json', ordered_issues)
+    _write_json(snapshot_dir / 'rows.json', ordered_pages)
+    _write_json(snapshot_dir / 'hashes.json', hashes)
+    manifest['snapshots'].append({
+        'version': version,
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'issues': f"snapshots/v{version}/issues.json",
+        'rows': f"snapshots/v{version}/rows.json",
+        'issue_count': len(issues),
+        'page_count': len(pages),
+        'bytes': sum((snapshot_dir / name).stat().st_size for name in ('issues.json', 'rows.json')),
+    })
+
+    if delta is not None:
+        delta_path = out_dir / 'deltas' / f"v{previous}-v{version}.json"
+        _write_json(delta_path, delta)
+        manifest['deltas'].append({
+            'from': previous,
+            'to': version,
+            'path': f"deltas/v{previous}-v{version}.json",
+            'bytes': delta_path.stat().st_size,
+            **{f"{kind}_pages": len(delta['pages'][kind]) for kind in ('added', 'changed', 'deleted')},
+            **{f"{kind}_issues": len(delta['issues'][kind]) for kind in ('added', 'changed', 'deleted')},
+        })
+        print(f"v{previous} -> v{version}: {len(delta['pages']['added'])} added, "
+              f"{len(delta['pages']['changed'])} changed, {len(delta['pages']['deleted'])} deleted pages "
+              f"({delta_path.stat().st_size:,} bytes vs {manifest['snapshots'][-1]['bytes']:,} byte snapshot)")
+
+    manifest['latest'] = version
+    manifest['snapshots'] = manifest['snapshots'][-1:]
+    _write_json(out_dir / 'manifest.json', manifest)
+
+    # Only the latest snapshot is deployed; earlier ones are kept for verify only
+    # (deltas stay so older clients can still catch up)
+    for snapshot_dir in _snapshot_dirs(out_dir):
+        if snapshot_dir.name != f"v{version}":
+            target = history_dir / 'snapshots' / snapshot_dir.name
+            shutil.rmtree(target, ignore_errors=True)
+            target.parent.mkdir(parents=True, exist_ok=True)
+            shutil.move(str(snapshot_dir), str(target))
+    kept = _snapshot_dirs(history_dir)
+    for snapshot_dir in kept[:max(len(kept) - keep, 0)]:
+        shutil.rmtree(snapshot_dir, ignore_errors=True)
+    print(f"Published v{version}: {len(issues)} issues, {len(pages)} pages")
+    return version
+
+def _snapshot_dirs(root: Path) -> List[Path]:
+    """Snapshot directories under root, oldest first"""
+    snapshots = root / 'snapshots'
+    if not snapshots.exists():
+        return []
+    return sorted(snapshots.glob('v*'), key=lambda path: int(path.name[1:]))
+
+def verify(out_dir: Path, history_dir: Path = DEFAULT_HISTORY) -> bool:
+    """Check that every kept snapshot plus the deltas after it reproduces the latest snapshot"""
+    manifest = load_manifest(out_dir)
+    if manifest['latest'] is None:
+        print("Nothing published yet")
+        return True
+
+    deltas = {entry['from']: entry for entry in manifest['deltas']}
+    latest_hashes = _read_json(out_dir / 'snapshots' / f"v{manifest['latest']}" / 'hashes.json')
+    ok = True
+    for snapshot_dir in _snapshot_dirs(history_dir) + _snapshot_dirs(out_dir):
+        start = version = int(snapshot_dir.name[1:])
+        issues, pages = load_snapshot(snapshot_dir.parent.parent, version)
+        while version != manifest['latest']:
+            if version not in deltas:
+                print(f"✗ No delta from v{version}")
+                ok = False
+                break
+            apply_delta(issues, pages, _read_json(out_dir / deltas[version]['path']))
+            version = deltas[version]['to']
+        else:
+            if _hashes(issues) == latest_hashes['issues'] and _hashes(pages) == latest_hashes['pages']:
+                print(f"✓ v{start} + deltas reproduces v{manifest['latest']}")
+            else:
+                print(f"✗ v{start} + deltas does not reproduce v{manifest['latest']}")
+                ok = False
+    return ok
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Versioned snapshots and delta packs for the frontend")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = subparsers.add_parser('build', help="publish a new version if anything changed")
+    build_parser.add_argument('--out', type=Path, default=DEFAULT_OUT)
+    build_parser.add_argument('--rows', type=Path, help="build from an existing rows.json instead of Supabase")
+    build_parser.add_argument('--issues', type=Path, help="build from an existing issues.json instead of Supabase")
+    build_parser.add_argument('--history', type=Path, default=DEFAULT_HISTORY,
+                              help="where earlier snapshots are kept, outside the deployed site")
+    build_parser.add_argument('--keep', type=int, default=5, help="earlier snapshots to keep for verify")
+
+    verify_parser = subparsers.add_parser('verify', help="check every delta chain")
+    verify_parser.add_argument('--out', type=Path, default=DEFAULT_OUT)
+    verify_parser.add_argument('--history', type=Path, default=DEFAULT_HISTORY)
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        if args.rows or args.issues:
+            if not (args.rows and args.issues):
+                parser.error("--rows and --issues go together")
+            tables = {'issues': _read_json(args.issues), 'pages': _read_json(args.rows)}
+        else:
+            tables = fetch_tables()
+        build(tables, args.out, args.keep, args.history)
+    elif args.command == 'verify':
+        if not verify(args.out, args.history):
+            raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
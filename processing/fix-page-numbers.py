@@ -3,6 +3,7 @@ from pathlib import Path
 from supabase import create_client, Client
 from dotenv import load_dotenv
 import PyPDF2
+import mirror
 
 # Load environment variables and initialize Supabase client
 load_dotenv()
@@ -15,13 +16,11 @@ def fix_page_numbers():
     """
     Set page numbers for issues where they are null by checking the PDF files
     """
-    # Get all issues where num_pages is null
-    issues = supabase.table('issue')\
-        .select('*')\
-        .is_('num_pages', 'null')\
-        .execute()
+    # Get all issues where num_pages is null from the local mirror
+    conn = mirror.sync(supabase)
+    issues = conn.execute("select id, filename from issue where num_pages is null").fetchall()
     
-    for issue in issues.data:
+    for issue in issues:
         issue_id = issue['id']
         filename = issue['filename']
         
@@ -40,6 +39,7 @@ def fix_page_numbers():
             .update({'num_pages': pdf_page_count})\
             .eq('id', issue_id)\
             .execute()
+        mirror.update_issue(conn, issue_id, num_pages=pdf_page_count)
             
         print(f"Updated {filename}: set to {pdf_page_count} pages")
 
@@ -0,0 +1,331 @@
+"""
+Single-file archive of all OCR text with random access by issue and page.
+
+Layout (all integers little-endian):
+
+    header    magic "WETX", u16 version, u16 flags,
+              u64 dict offset, u64 dict length, u64 index offset, u64 index length
+    dict      zstd dictionary trained on the corpus
+    frames    one zstd frame per page, compressed with the dictionary;
+              the pages of an issue are contiguous and in page order
+    index     zstd-compressed JSON: issue filename -> byte span + page spans
+
+A reader only needs the header, the dictionary and the index to serve any
+page, so the archive can sit on a static host and be read with HTTP range
+requests: one request per page, or one per issue. A reader can be shared
+between threads: local reads use os.pread, each thread gets its own HTTP
+session and every read its own decompressor.
+
+    python fulltext_archive.py build [--output fulltext.wetx]
+    python fulltext_archive.py page fulltext.wetx WEC-001.pdf 12
+    python fulltext_archive.py issue https://example.com/fulltext.wetx WEC-001.pdf
+    python fulltext_archive.py bench fulltext.wetx [--text-dir OCR-results]
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import struct
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import zstandard as zstd
+
+import mirror
+
+MAGIC = b'WETX'
+VERSION = 1
+HEADER = struct.Struct('<4sHHQQQQ')
+
+DEFAULT_DICT_SIZE = 112 * 1024
+DEFAULT_LEVEL = 19
+
+def clean_ocr_text(text: str) -> str:
+    """Same cleanup make-pages applies before writing the text dump"""
+    return text.replace('```text', '')
+
+def fetch_corpus(conn=None) -> Dict[str, List[Tuple[str, str]]]:
+    """Every non-error page from the local mirror, grouped by issue filename"""
+    conn = conn or mirror.sync()
+
+    corpus = {}
+    rows = conn.execute("""
+        select issue.filename, page.page_number, page.ocr_result
+        from page
+        join issue on issue.id = page.parent_issue_id
+        where not page.error
+    """)
+    for filename, page_number, ocr_result in rows:
+        corpus.setdefault(filename, []).append((page_number, clean_ocr_text(ocr_result or '')))
+    return corpus
+
+def build_archive(corpus: Dict[str, Iterable[Tuple[str, str]]], output_path: Path,
+                  dict_size: int = DEFAULT_DICT_SIZE, level: int = DEFAULT_LEVEL) -> dict:
+    """
+    Write an archive from {filename: [(page_number, text), ...]}.
+    Returns a summary with page count and raw/compressed sizes.
+    """
+    corpus = {
+        filename: sorted(pages, key=lambda page: mirror.page_sort_key(page[0]))
+        for filename, pages in sorted(corpus.items())
+    }
+    samples = [text.encode('utf-8') for pages in corpus.values() for _, text in pages if text]
+    if not samples:
+        raise ValueError("No pages to archive")
+
+    try:
+        dictionary = zstd.train_dictionary(dict_size, samples, level=level)
+    except zstd.ZstdError:
+        # Training fails on very small corpora; frames then just go without a dictionary
+        dictionary = None
+    dict_bytes = dictionary.as_bytes() if dictionary else b''
+    compressor = zstd.ZstdCompressor(level=level, dict_data=dictionary, write_checksum=True)
+
+    index = {'issues': {}}
+    raw_bytes = 0
+    page_count = 0
+
+    tmp_path = Path(f"{output_path}.tmp")
+    with open(tmp_path, 'wb') as f:
+        f.write(b'\0' * HEADER.size)
+        dict_offset = f.tell()
+        f.write(dict_bytes)
+
+        for filename, pages in corpus.items():
+            issue_offset = f.tell()
+            page_spans = []
+            for page_number, text in pages:
+                data = text.encode('utf-8')
+                frame = compressor.compress(data)
+                page_spans.append([page_number, f.tell() - issue_offset, len(frame), len(data)])
+                f.write(frame)
+                raw_bytes += len(data)
+                page_count += 1
+            index['issues'][filename] = {
+                'offset': issue_offset,
+                'length': f.tell() - issue_offset,
+                'pages': page_spans,
+            }
+
+        index_offset = f.tell()
+        index_bytes = zstd.ZstdCompressor(level=level).compress(json.dumps(index).encode('utf-8'))
+        f.write(index_bytes)
+
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, VERSION, 0, dict_offset, len(dict_bytes),
+                            index_offset, len(index_bytes)))
+    tmp_path.replace(output_path)
+
+    return {
+        'issues': len(corpus),
+        'pages': page_count,
+        'raw_bytes': raw_bytes,
+        'archive_bytes': Path(output_path).stat().st_size,
+        'dict_bytes': len(dict_bytes),
+    }
+
+class FullTextArchive:
+    """
+    Reader for a full-text archive on local disk or behind an HTTP server
+    that supports range requests.
+    """
+
+    def __init__(self, source: str):
+        self.source = str(source)
+        self._is_http = self.source.startswith(('http://', 'https://'))
+        self._fd = None
+        # One requests.Session per thread; sessions aren't safe to share
+        self._local = threading.local()
+        self._sessions = []
+        self._sessions_lock = threading.Lock()
+        if not self._is_http:
+            self._fd = os.open(self.source, os.O_RDONLY)
+
+        magic, version, _, dict_offset, dict_length, index_offset, index_length = \
+            HEADER.unpack(self._read_range(0, HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(f"{self.source} is not a full-text archive")
+        if version != VERSION:
+            raise ValueError(f"Unsupported archive version {version}")
+
+        # Dictionary and index are loaded once; after that every read is a single range
+        dict_bytes = self._read_range(dict_offset, dict_length) if dict_length else b''
+        self._dictionary = zstd.ZstdCompressionDict(dict_bytes) if dict_bytes else None
+
+        index_bytes = self._read_range(index_offset, index_length)
+        index = json.loads(zstd.ZstdDecompressor().decompress(index_bytes))
+        self._issues = index['issues']
+        self._page_lookup = {
+            filename: {span[0]: span for span in issue['pages']}
+            for filename, issue in self._issues.items()
+        }
+
+    def _session(self):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            import requests
+            session = self._local.session = requests.Session()
+            with self._sessions_lock:
+                self._sessions.append(session)
+        return session
+
+    def _read_range(self, offset: int, length: int) -> bytes:
+        if self._is_http:
+            headers = {'Range': f"bytes={offset}-{offset + length - 1}"}
+            response = self._session().get(self.source, headers=headers)
+            if response.status_code != 206:
+                raise IOError(f"Range request failed with status {response.status_code}: {self.source}")
+            return response.content
+        # No shared file position, so concurrent reads can't interleave
+        return os.pread(self._fd, length, offset)
+
+    def _decompressor(self) -> zstd.ZstdDecompressor:
+        # Decompressors aren't thread-safe; the dictionary is only digested once and cached
+        return zstd.ZstdDecompressor(dict_data=self._dictionary)
+
+    def issues(self) -> List[str]:
+        """Filenames of every archived issue"""
+        return list(self._issues)
+
+    def page_numbers(self, filename: str) -> List[str]:
+        """Page numbers archived for an issue, in page order"""
+        return [span[0] for span in self._issues[filename]['pages']]
+
+    def read_page(self, filename: str, page_number: str) -> str:
+        """Text of one page, decompressing only that page"""
+        issue = self._issues[filename]
+        _, offset, length, _ = self._page_lookup[filename][str(page_number)]
+        frame = self._read_range(issue['offset'] + offset, length)
+        return self._decompressor().decompress(frame).decode('utf-8')
+
+    def read_issue_pages(self, filename: str) -> List[Tuple[str, str]]:
+        """(page_number, text) for every page of an issue, with a single read"""
+        issue = self._issues[filename]
+        data = self._read_range(issue['offset'], issue['length'])
+        decompressor = self._decompressor()
+        return [
+            (page_number, decompressor.decompress(data[offset:offset + length]).decode('utf-8'))
+            for page_number, offset, length, _ in issue['pages']
+        ]
+
+    def read_issue(self, filename: str) -> str:
+        """Full text of an issue, in the same form as make-pages' text dump"""
+        return ''.join(text + "\n" for _, text in self.read_issue_pages(filename))
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+        with self._sessions_lock:
+            for session in self._sessions:
+                session.close()
+            self._sessions.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def _latency_summary(samples: List[float]) -> str:
+    """Median and p95 of latencies in seconds, formatted in milliseconds"""
+    if len(samples) < 2:
+        return f"{samples[0] * 1000:.3f} ms" if samples else "n/a"
+    cuts = statistics.quantiles(samples, n=20)
+    return f"median {statistics.median(samples) * 1000:.3f} ms, p95 {cuts[18] * 1000:.3f} ms"
+
+def benchmark(archive_path: str, text_dir: Path, reads: int = 1000, seed: int = 0):
+    """Compare size and random-read latency of the archive against the per-issue text dump"""
+    rng = random.Random(seed)
+
+    start = time.perf_counter()
+    archive = FullTextArchive(archive_path)
+    open_seconds = time.perf_counter() - start
+
+    text_files = {
+        filename: text_dir / f"{filename.replace('.pdf', '')}.txt"
+        for filename in archive.issues()
+    }
+    text_files = {filename: path for filename, path in text_files.items() if path.exists()}
+    dump_bytes = sum(path.stat().st_size for path in text_files.values())
+    archive_bytes = os.path.getsize(archive_path)
+
+    print(f"Archive: {archive_bytes:,} bytes ({len(archive.issues())} issues), opened in {open_seconds * 1000:.1f} ms")
+    if text_files:
+        print(f"Text dump: {dump_bytes:,} bytes ({len(text_files)} files)")
+        print(f"Archive is {archive_bytes / dump_bytes:.1%} of the text dump "
+              f"(for the {len(text_files)} issues present in both)")
+    else:
+        print(f"No text dump found in {text_dir}, skipping the comparison")
+
+    pages = [(filename, page_number) for filename in archive.issues() for page_number in archive.page_numbers(filename)]
+    page_latencies = []
+    for filename, page_number in rng.choices(pages, k=reads):
+        start = time.perf_counter()
+        archive.read_page(filename, page_number)
+        page_latencies.append(time.perf_counter() - start)
+    print(f"Archive random page read: {_latency_summary(page_latencies)}")
+
+    issue_latencies = []
+    for filename in rng.choices(archive.issues(), k=reads):
+        start = time.perf_counter()
+        archive.read_issue(filename)
+        issue_latencies.append(time.perf_counter() - start)
+    print(f"Archive random issue read: {_latency_summary(issue_latencies)}")
+
+    if text_files:
+        # The text dump has no page boundaries, so a page read means reading the whole issue file
+        dump_latencies = []
+        for filename in rng.choices(list(text_files), k=reads):
+            start = time.perf_counter()
+            with open(text_files[filename], 'r', encoding='utf-8') as f:
+                f.read()
+            dump_latencies.append(time.perf_counter() - start)
+        print(f"Text dump random issue (or page) read: {_latency_summary(dump_latencies)}")
+
+    archive.close()
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Compressed full-text archive of OCR results")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = subparsers.add_parser('build', help="build the archive from the page table")
+    build_parser.add_argument('--output', default='fulltext.wetx')
+    build_parser.add_argument('--dict-size', type=int, default=DEFAULT_DICT_SIZE)
+    build_parser.add_argument('--level', type=int, default=DEFAULT_LEVEL)
+
+    page_parser = subparsers.add_parser('page', help="print one page")
+    page_parser.add_argument('archive', help="path or http(s) URL")
+    page_parser.add_argument('filename')
+    page_parser.add_argument('page_number')
+
+    issue_parser = subparsers.add_parser('issue', help="print one issue")
+    issue_parser.add_argument('archive', help="path or http(s) URL")
+    issue_parser.add_argument('filename')
+
+    bench_parser = subparsers.add_parser('bench', help="compare against the per-issue text dump")
+    bench_parser.add_argument('archive')
+    bench_parser.add_argument('--text-dir', type=Path, default=Path('OCR-results'))
+    bench_parser.add_argument('--reads', type=int, default=1000)
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        summary = build_archive(fetch_corpus(), Path(args.output), args.dict_size, args.level)
+        print(f"Archived {summary['pages']} pages from {summary['issues']} issues: "
+              f"{summary['raw_bytes']:,} bytes of text -> {summary['archive_bytes']:,} bytes "
+              f"({summary['dict_bytes']:,} byte dictionary)")
+    elif args.command == 'page':
+        with FullTextArchive(args.archive) as archive:
+            print(archive.read_page(args.filename, args.page_number))
+    elif args.command == 'issue':
+        with FullTextArchive(args.archive) as archive:
+            print(archive.read_issue(args.filename), end='')
+    elif args.command == 'bench':
+        benchmark(args.archive, args.text_dir, args.reads)
+
+if __name__ == "__main__":
+    main()
@@ -7,7 +7,12 @@ from pdf2image import convert_from_path
 import uuid
 from typing import List, Tuple
 import time
+import gc
 import PyPDF2
+from hedging import HedgedCaller
+import page_dedup
+import adaptive_ocr
+import threading
 
 # Load environment variables
 load_dotenv()
@@ -20,6 +25,38 @@ supabase: Client = create_client(
 # Initialize Gemini model
 model = genai.GenerativeModel('gemini-2.0-flash')
 
+OCR_PROMPT = """
+    Extract and transcribe the text content from this page.
+    Maintain the original structure but do not add any annotations.
+    """
+
+# Every request gets a deadline; requests slower than the rolling HEDGE_PERCENTILE
+# of recent latencies are duplicated, for at most HEDGE_BUDGET of all requests.
+# Set OCR_HEDGE_PERCENTILE=0 to disable hedging.
+REQUEST_DEADLINE = float(os.getenv('OCR_REQUEST_DEADLINE', '120'))
+HEDGE_PERCENTILE = float(os.getenv('OCR_HEDGE_PERCENTILE', '95'))
+HEDGE_BUDGET = float(os.getenv('OCR_HEDGE_BUDGET', '0.1'))
+# Pages OCR'd in parallel per issue
+MAX_WORKERS = int(os.getenv('OCR_MAX_WORKERS', '10'))
+gemini_requests = HedgedCaller(
+    deadline=REQUEST_DEADLINE,
+    hedge_percentile=HEDGE_PERCENTILE,
+    hedge_budget=HEDGE_BUDGET,
+    # Room for every page worker plus its hedge
+    max_workers=2 * MAX_WORKERS,
+)
+
+# Blank and near-duplicate pages found by page_dedup.py skip the model call
+dedup = page_dedup.PageDeduplicator() if page_dedup.HASH_DB_PATH.exists() else None
+calls_saved = {'blank': 0, 'duplicate': 0}
+calls_saved_lock = threading.Lock()
+# Gemini requests transcribe repeated after a failed attempt
+retries = {'count': 0}
+retries_lock = threading.Lock()
+
+# Per-tier counts when OCR_ADAPTIVE_DPI=1; see adaptive_ocr.py
+tier_stats = adaptive_ocr.TierStats()
+
 def issue_exists(filename: str) -> bool:
     """Check if an issue already exists in the database"""
     result = supabase.table('issue').select('id').eq('filename', filename).execute()
@@ -49,56 +86,129 @@ def get_processed_pages(issue_id: str) -> set:
     result = supabase.table('page').select('page_number').eq('parent_issue_id', issue_id).execute()
     return {page['page_number'] for page in result.data}
 
-def process_page(image: object, page_num: int, filename: str, issue_id: str) -> Tuple[int, str]:
-    """Process a single page with Gemini"""
-    prompt = f"""
-    Extract and transcribe the text content from this page.
-    Maintain the original structure but do not add any annotations.
-    """
+def reuse_transcription(page_num: int, filename: str, issue_id: str) -> bool:
+    """Store a blank-page error or an earlier duplicate's transcription instead of calling Gemini"""
+    if dedup is None:
+        return False
+    match = dedup.lookup(filename, page_num)
+    if match is None:
+        return False
+    
+    if match.kind == 'blank':
+        # Stored as an error, not as an empty transcription, so it can be found and re-OCR'd
+        store_page(issue_id, page_num, None, page_dedup.BLANK_ERROR)
+    else:
+        # Only reuse the earlier page once it has a good transcription of its own
+        canonical_issue = supabase.table('issue').select('id').eq('filename', match.filename).execute()
+        if not canonical_issue.data:
+            return False
+        canonical_page = supabase.table('page')\
+            .select('ocr_result')\
+            .eq('parent_issue_id', canonical_issue.data[0]['id'])\
+            .eq('page_number', str(match.page_number))\
+            .eq('error', False)\
+            .execute()
+        if not canonical_page.data:
+            return False
+        store_page(issue_id, page_num, canonical_page.data[0]['ocr_result'], None)
+    
+    with calls_saved_lock:
+        calls_saved[match.kind] += 1
+    return True
+
+def transcribe(image: object) -> Tuple[str, str]:
+    """Send a page image to Gemini, retrying failures; returns (text, error)"""
+    prompt = OCR_PROMPT
     
     max_retries = 3
     retry_delay = 1
     
     for attempt in range(max_retries):
         try:
-            response = model.generate_content([prompt, image])
+            response = gemini_requests.call(
+                model.generate_content,
+                [prompt, image],
+                request_options={'timeout': REQUEST_DEADLINE},
+            )
             
             # Check if we got a valid response
             if not response.text:
-                error_msg = "Copyright detection or empty response"
-                # Store the error in the database
-                supabase.table('page').insert({
-                    'parent_issue_id': issue_id,
-                    'page_number': str(page_num),
-                    'ocr_result': f"ERROR: {error_msg}",
-                    'error': True  # Add this column to your schema
-                }).execute()
-                return page_num, error_msg
+                return None, "Copyright detection or empty response"
             
-            # Store successful result
-            supabase.table('page').insert({
-                'parent_issue_id': issue_id,
-                'page_number': str(page_num),
-                'ocr_result': response.text,
-                'error': False
-            }).execute()
-            
-            return page_num, None
+            return response.text, None
             
         except Exception as e:
             if attempt == max_retries - 1:
-                # Store the error in the database
-                supabase.table('page').insert({
-                    'parent_issue_id': issue_id,
-                    'page_number': str(page_num),
-                    'ocr_result': f"ERROR: {str(e)}",
-                    'error': True
-                }).execute()
-                return page_num, str(e)
+                return None, str(e)
+            with retries_lock:
+                retries['count'] += 1
             time.sleep(retry_delay * (attempt + 1))
 
-def process_pdf(pdf_path: str):
-    """Process a PDF file page by page and store results in Supabase"""
+def store_page(issue_id: str, page_num: int, text: str, error: str):
+    """Store a transcription, or the error that prevented one"""
+    supabase.table('page').insert({
+        'parent_issue_id': issue_id,
+        'page_number': str(page_num),
+        'ocr_result': f"ERROR: {error}" if error else text,
+        'error': bool(error)  # Add this column to your schema
+    }).execute()
+
+def process_page(image: object, page_num: int, filename: str, issue_id: str) -> Tuple[int, str]:
+    """Process a single page with Gemini"""
+    text, error = transcribe(image)
+    store_page(issue_id, page_num, text, error)
+    return page_num, error
+
+def render_page(pdf_path: str, page_num: int, dpi: int):
+    """Render one page of a PDF, or None if the conversion produced nothing"""
+    images = convert_from_path(
+        pdf_path,
+        dpi=dpi,
+        first_page=page_num,
+        last_page=page_num,
+        thread_count=1,
+    )
+    return images[0] if images else None
+
+def process_page_adaptive(pdf_path: str, page_num: int, filename: str, issue_id: str) -> Tuple[int, str]:
+    """OCR a page at low DPI, re-rendering at high DPI only if the result looks wrong"""
+    image = render_page(pdf_path, page_num, adaptive_ocr.LOW_DPI)
+    if image is None:
+        return page_num, "Failed to convert page"
+    low_pixels = image.width * image.height
+    ink = page_dedup.ink_coverage(image)
+    low_jpeg = adaptive_ocr.encode_image(image)
+    image.close()
+    
+    text, error = transcribe({'mime_type': 'image/jpeg', 'data': low_jpeg})
+    reason = adaptive_ocr.escalation_reason(text, ink, adaptive_ocr.load_vocabulary())
+    if not reason:
+        tier_stats.record(low_pixels, len(low_jpeg))
+        store_page(issue_id, page_num, text, error)
+        return page_num, error
+    
+    image = render_page(pdf_path, page_num, adaptive_ocr.HIGH_DPI)
+    if image is None:
+        # Still an escalation, just one that had to keep the low-DPI result
+        tier_stats.record(low_pixels, len(low_jpeg), reason=reason, fell_back=bool(text))
+        store_page(issue_id, page_num, text, error)
+        return page_num, error
+    high_pixels = image.width * image.height
+    high_jpeg = adaptive_ocr.encode_image(image)
+    image.close()
+    
+    low_text = text
+    text, error = transcribe({'mime_type': 'image/jpeg', 'data': high_jpeg})
+    # A short or odd-looking low-DPI transcription still beats storing an error
+    fell_back = bool(error and low_text)
+    if fell_back:
+        text, error = low_text, None
+    tier_stats.record(low_pixels, len(low_jpeg), high_pixels, len(high_jpeg), reason, fell_back)
+    store_page(issue_id, page_num, text, error)
+    return page_num, error
+
+def process_pdf(pdf_path: str) -> bool:
+    """Process a PDF file page by page and store results in Supabase; returns True once every page is stored"""
     print(f"Processing {pdf_path}")
     
     # Get or create issue record
@@ -114,38 +224,44 @@ def process_pdf(pdf_path: str):
     processed_pages = get_processed_pages(issue_id)
     if len(processed_pages) == pdf_page_count:
         print(f"✓ {filename}: All {pdf_page_count} pages already processed")
-        return
+        return True
     
     print(f"Total pages in PDF: {pdf_page_count}")
     print(f"Pages already in database: {len(processed_pages)}")
     
     from concurrent.futures import ThreadPoolExecutor
-    import threading
     
     def process_single_page(page_num):
         thread_name = threading.current_thread().name
-        print(f"{thread_name}: Converting page {page_num}/{pdf_page_count}")
         
         try:
-            # Convert single page with lower DPI and memory optimization
-            images = convert_from_path(
-                pdf_path,
-                dpi=300,  
-                first_page=page_num,
-                last_page=page_num,
-                thread_count=1,  
-            )
-            
-            if not images:
-                print(f"{thread_name}: Failed to convert page {page_num}")
+            if reuse_transcription(page_num, filename, issue_id):
+                print(f"{thread_name}: Reused transcription for page {page_num} (blank or duplicate)")
                 return
             
-            # Process the page
-            result = process_page(images[0], page_num, filename, issue_id)
-            
-            # Clear the image from memory immediately
-            images[0].close()
-            del images
+            print(f"{thread_name}: Converting page {page_num}/{pdf_page_count}")
+            if adaptive_ocr.ADAPTIVE_DPI:
+                result = process_page_adaptive(pdf_path, page_num, filename, issue_id)
+            else:
+                # Convert single page with lower DPI and memory optimization
+                images = convert_from_path(
+                    pdf_path,
+                    dpi=300,  
+                    first_page=page_num,
+                    last_page=page_num,
+                    thread_count=1,  
+                )
+                
+                if not images:
+                    print(f"{thread_name}: Failed to convert page {page_num}")
+                    return
+                
+                # Process the page
+                result = process_page(images[0], page_num, filename, issue_id)
+                
+                # Clear the image from memory immediately
+                images[0].close()
+                del images
             
             # Force garbage collection
             import gc
@@ -169,10 +285,21 @@ def process_pdf(pdf_path: str):
     ]
     
     # Process pages with thread pool
-    with ThreadPoolExecutor(max_workers=10) as executor:
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
         executor.map(process_single_page, pages_to_process)
         
     print(f"Completed processing {filename}")
+    # The counters are shared by every issue this process handles
+    print(f"Gemini requests so far (all issues): {gemini_requests.report()}")
+    print(f"Gemini calls saved so far: {calls_saved['blank']} blank, {calls_saved['duplicate']} duplicate pages")
+    if adaptive_ocr.ADAPTIVE_DPI:
+        print(f"Adaptive resolution so far: {tier_stats.report()}")
+    
+    # Pages whose worker raised were never stored; a rerun picks them up
+    missing = pdf_page_count - len(get_processed_pages(issue_id))
+    if missing:
+        print(f"{filename}: {missing} pages still missing")
+    return missing == 0
 
 def process_directory(directory: str = "WECs"):
     """Process all PDFs in a directory"""
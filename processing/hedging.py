@@ -0,0 +1,165 @@
+"""
+Deadline-bounded, optionally hedged calls for slow remote requests.
+
+A HedgedCaller runs each request on its own thread pool and waits at most
+`deadline` seconds for it. If hedging is enabled and the request is still
+running once it has taken longer than the rolling `hedge_percentile` of
+recent latencies, a duplicate is sent and whichever finishes first wins.
+The loser is cancelled if it hasn't started yet and otherwise left to finish
+in the background with its result discarded; callers should also give the
+underlying client a timeout so losers don't linger. `hedge_budget` caps the
+fraction of requests that may be duplicated.
+"""
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, List, Optional
+
+def percentile(samples: List[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile (q in 0-100) of the samples, or None if there are none"""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(q / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+class LatencyTracker:
+    """Thread-safe rolling window of request latencies"""
+
+    def __init__(self, window: int = 200):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        with self._lock:
+            samples = list(self._samples)
+        return percentile(samples, q)
+
+    def __len__(self):
+        return len(self._samples)
+
+class HedgedCaller:
+    """Runs calls with a deadline and hedges the slow ones; see module docstring"""
+
+    def __init__(self, deadline: float = 120.0, hedge_percentile: Optional[float] = 95.0,
+                 hedge_budget: float = 0.1, min_samples: int = 20, max_workers: int = 20,
+                 window: int = 200):
+        self.deadline = deadline
+        self.hedge_percentile = hedge_percentile
+        self.hedge_budget = hedge_budget
+        self.min_samples = min_samples
+        self.attempt_latencies = LatencyTracker(window)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='request')
+        self._lock = threading.Lock()
+        # End-to-end latency of the most recent successful calls, for reporting
+        self._call_latencies = deque(maxlen=window)
+        self._counts = {'requests': 0, 'hedges': 0, 'hedge_wins': 0, 'cancelled': 0, 'timeouts': 0, 'errors': 0}
+
+    def _count(self, key: str):
+        with self._lock:
+            self._counts[key] += 1
+
+    def _hedge_delay(self) -> Optional[float]:
+        """How long to wait before hedging, or None if hedging isn't allowed now"""
+        if not self.hedge_percentile or len(self.attempt_latencies) < self.min_samples:
+            return None
+        with self._lock:
+            if self._counts['hedges'] + 1 > self.hedge_budget * self._counts['requests']:
+                return None
+        return self.attempt_latencies.percentile(self.hedge_percentile)
+
+    def _submit(self, fn: Callable, args, kwargs):
+        started = time.perf_counter()
+        future = self._executor.submit(fn, *args, **kwargs)
+
+        def record(done):
+            if not done.cancelled() and done.exception() is None:
+                self.attempt_latencies.record(time.perf_counter() - started)
+        future.add_done_callback(record)
+        return future
+
+    def call(self, fn: Callable, *args, **kwargs):
+        """
+        Call fn(*args, **kwargs) and return its result. Raises TimeoutError if
+        no attempt finishes within the deadline, or the first attempt's
+        exception if every attempt fails.
+        """
+        self._count('requests')
+        start = time.perf_counter()
+        deadline_at = start + self.deadline
+
+        primary = self._submit(fn, args, kwargs)
+        pending = {primary}
+        hedge = None
+
+        hedge_delay = self._hedge_delay()
+        if hedge_delay is not None:
+            done, _ = wait(pending, timeout=min(hedge_delay, self.deadline))
+            # Re-check the budget: other threads may have hedged while we waited
+            if not done and self._hedge_delay() is not None:
+                self._count('hedges')
+                hedge = self._submit(fn, args, kwargs)
+                pending.add(hedge)
+
+        failures = []
+        while pending:
+            remaining = deadline_at - time.perf_counter()
+            if remaining <= 0:
+                break
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is not None:
+                    failures.append(future.exception())
+                    continue
+                with self._lock:
+                    self._call_latencies.append(time.perf_counter() - start)
+                if future is hedge:
+                    self._count('hedge_wins')
+                for loser in pending:
+                    if loser.cancel():
+                        self._count('cancelled')
+                return future.result()
+
+        for loser in pending:
+            if loser.cancel():
+                self._count('cancelled')
+
+        if failures and not pending:
+            self._count('errors')
+            raise failures[0]
+        self._count('timeouts')
+        raise TimeoutError(f"Request exceeded {self.deadline:g}s deadline")
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Counters since the caller was created, plus hedge rate and end-to-end
+        latency percentiles over the last `window` successful calls
+        """
+        with self._lock:
+            stats = dict(self._counts)
+            latencies = list(self._call_latencies)
+        stats['hedge_rate'] = stats['hedges'] / stats['requests'] if stats['requests'] else 0.0
+        for q in (50, 90, 99):
+            stats[f"p{q}"] = percentile(latencies, q)
+        return stats
+
+    def report(self) -> str:
+        stats = self.stats()
+        if not stats['requests']:
+            return "No requests made"
+        def fmt(seconds):
+            return "n/a" if seconds is None else f"{seconds:.2f}s"
+        return (
+            f"{stats['requests']} requests, {stats['hedges']} hedged ({stats['hedge_rate']:.1%}), "
+            f"{stats['hedge_wins']} hedge wins, {stats['timeouts']} timeouts, {stats['errors']} errors; "
+            f"recent latency p50 {fmt(stats['p50'])}, p90 {fmt(stats['p90'])}, p99 {fmt(stats['p99'])}"
+        )
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
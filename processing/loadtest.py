@@ -0,0 +1,682 @@
+"""
+Offline load-test harness for the ingestion scripts.
+
+Runs the real gemini_page_ocr.py, batch_ocr.py (local backend),
+upload-images.py or scrape-and-download.py against in-process fakes of
+Gemini, the Supabase table API, Cloudinary and wholeearth.info, on a
+synthetic PDF corpus, and reports throughput, latency
+percentiles, failures, retries and peak memory. Nothing leaves the machine
+and no quota is used.
+
+    python loadtest.py ocr --issues 3 --pages 12 --workers 10
+    python loadtest.py ocr --latency gemini=lognormal:2:0.6 --rate-429 gemini=0.05 --rps gemini=5
+    python loadtest.py batch --issues 3 --pages 12
+    python loadtest.py images --latency cloudinary=uniform:0.2:1.0 --error-rate cloudinary=0.02
+    python loadtest.py scrape --issues 20
+    python loadtest.py corpus WECs --issues 5 --pages 40
+
+Latency specs are `fixed:S`, `uniform:LO:HI` or `lognormal:MEDIAN:SIGMA` in
+seconds; --time-scale multiplies every fake latency. --rps enforces a
+per-service token bucket that answers with a 429 when it runs dry. A run
+that hasn't finished after --timeout seconds fails instead of hanging.
+
+The scripts still need their real local dependencies (pdf2image with
+poppler, PyPDF2, Pillow, python-dotenv, and selenium/bs4 for `scrape`); only
+the remote services are faked.
+"""
+import argparse
+import contextlib
+import importlib.util
+import io
+import json
+import math
+import os
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import types
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from hedging import percentile
+
+HERE = Path(__file__).resolve().parent
+
+DEFAULT_LATENCY = {
+    'gemini': 'lognormal:1.5:0.5',
+    'supabase': 'lognormal:0.05:0.4',
+    'cloudinary': 'lognormal:0.4:0.5',
+    'site': 'lognormal:0.2:0.4',
+}
+
+WORDS = (
+    "access to tools whole earth catalog shelter land use industry craft communications "
+    "community nomadics learning dome geodesic solar compost windmill greenhouse tipi "
+    "bicycle kayak loom kiln garden goat beekeeping homestead cybernetics synergy"
+).split()
+
+class FakeServiceError(Exception):
+    """Raised by a fake service; the message mimics the real client's"""
+
+class LatencyModel:
+    """Random request latency from a spec string, see module docstring"""
+
+    def __init__(self, spec: str, time_scale: float = 1.0, rng: Optional[random.Random] = None):
+        kind, *params = spec.split(':')
+        self.kind = kind
+        self.params = [float(param) for param in params]
+        self.time_scale = time_scale
+        self.rng = rng or random.Random()
+        if kind not in ('fixed', 'uniform', 'lognormal'):
+            raise ValueError(f"Unknown latency distribution: {spec}")
+
+    def sample(self) -> float:
+        if self.kind == 'fixed':
+            seconds = self.params[0]
+        elif self.kind == 'uniform':
+            seconds = self.rng.uniform(*self.params)
+        else:
+            median, sigma = self.params
+            seconds = self.rng.lognormvariate(math.log(median), sigma)
+        return seconds * self.time_scale
+
+class FakeService:
+    """Latency, error and rate-limit behaviour shared by every fake"""
+
+    def __init__(self, name: str, latency: LatencyModel, error_rate: float = 0.0,
+                 rate_429: float = 0.0, rps: Optional[float] = None, seed: int = 0):
+        self.name = name
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rate_429 = rate_429
+        self.rps = rps
+        self.rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._tokens = rps or 0.0
+        self._refilled_at = time.monotonic()
+        self.latencies: List[float] = []
+        self.counts = {'calls': 0, 'errors': 0, 'rate_limited': 0}
+
+    def _take_token(self) -> bool:
+        if not self.rps:
+            return True
+        now = time.monotonic()
+        self._tokens = min(self.rps, self._tokens + (now - self._refilled_at) * self.rps)
+        self._refilled_at = now
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+    def request(self):
+        """Simulate one round trip; raises FakeServiceError for injected failures"""
+        with self._lock:
+            self.counts['calls'] += 1
+            allowed = self._take_token()
+            roll = self.rng.random()
+            delay = self.latency.sample()
+
+        if not allowed or roll < self.rate_429:
+            with self._lock:
+                self.counts['rate_limited'] += 1
+            # Rejections come back quickly
+            time.sleep(delay * 0.1)
+            raise FakeServiceError(f"429 {self.name}: rate limit exceeded")
+
+        time.sleep(delay)
+        with self._lock:
+            self.latencies.append(delay)
+        if roll < self.rate_429 + self.error_rate:
+            with self._lock:
+                self.counts['errors'] += 1
+            raise FakeServiceError(f"500 {self.name}: internal error")
+
+    def summary(self) -> dict:
+        with self._lock:
+            latencies = list(self.latencies)
+            summary = dict(self.counts)
+        for q in (50, 90, 99):
+            summary[f"p{q}"] = percentile(latencies, q)
+        return summary
+
+# --- Gemini ---------------------------------------------------------------
+
+class FakeGeminiResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+class FakeGenerativeModel:
+    """Stands in for genai.GenerativeModel; returns plausible page text"""
+
+    def __init__(self, service: FakeService, empty_rate: float = 0.0):
+        self.service = service
+        self.empty_rate = empty_rate
+
+    def generate_content(self, contents, request_options=None):
+        self.service.request()
+        rng = self.service.rng
+        if rng.random() < self.empty_rate:
+            return FakeGeminiResponse('')
+        return FakeGeminiResponse(' '.join(rng.choice(WORDS) for _ in range(rng.randint(50, 600))))
+
+# --- Supabase ---------------------------------------------------------------
+
+class FakeResult:
+    def __init__(self, data: List[dict], count: Optional[int] = None):
+        self.data = data
+        self.count = count
+
+class FakeQuery:
+    """The subset of the PostgREST query builder the scripts use"""
+
+    def __init__(self, client: 'FakeSupabase', table: str):
+        self.client = client
+        self.table = table
+        self.action = 'select'
+        self.columns = '*'
+        self.payload = None
+        self.count = None
+        self.filters = []
+        self.ordering = []
+        self.max_rows = None
+
+    def select(self, columns: str = '*', count: Optional[str] = None):
+        self.columns, self.count = columns, count
+        return self
+
+    def insert(self, rows):
+        # A single row or a list of rows, like the real client
+        self.action, self.payload = 'insert', rows
+        return self
+
+    def update(self, values: dict):
+        self.action, self.payload = 'update', values
+        return self
+
+    def eq(self, column: str, value):
+        self.filters.append(lambda row: row.get(column) == value)
+        return self
+
+    def gt(self, column: str, value):
+        self.filters.append(lambda row: row.get(column) is not None and row[column] > value)
+        return self
+
+    def is_(self, column: str, value):
+        # Scripts pass both None and 'null'
+        self.filters.append(lambda row: row.get(column) is None)
+        return self
+
+    def order(self, column: str):
+        self.ordering.append(column)
+        return self
+
+    def limit(self, count: int):
+        self.max_rows = count
+        return self
+
+    def _project(self, row: dict) -> dict:
+        if self.columns.strip() == '*':
+            return dict(row)
+        return {column.strip(): row.get(column.strip()) for column in self.columns.split(',')}
+
+    def execute(self) -> FakeResult:
+        self.client.service.request()
+        with self.client.lock:
+            rows = self.client.tables[self.table]
+            if self.action == 'insert':
+                payload = self.payload if isinstance(self.payload, list) else [self.payload]
+                inserted = [{'id': str(uuid.uuid4()), 'created_at': datetime.now(timezone.utc).isoformat(), **row}
+                            for row in payload]
+                rows.extend(inserted)
+                return FakeResult([dict(row) for row in inserted])
+
+            matching = [row for row in rows if all(check(row) for check in self.filters)]
+            if self.action == 'update':
+                for row in matching:
+                    row.update(self.payload)
+                return FakeResult([dict(row) for row in matching])
+
+            for column in reversed(self.ordering):
+                matching.sort(key=lambda row: (row.get(column) is None, row.get(column)))
+            total = len(matching)
+            if self.max_rows is not None:
+                matching = matching[:self.max_rows]
+            return FakeResult([self._project(row) for row in matching], total if self.count else None)
+
+class FakeSupabase:
+    """In-memory issue and page tables behind a FakeService"""
+
+    def __init__(self, service: FakeService):
+        self.service = service
+        self.lock = threading.Lock()
+        self.tables: Dict[str, List[dict]] = {'issue': [], 'page': []}
+
+    def table(self, name: str) -> FakeQuery:
+        return FakeQuery(self, name)
+
+# --- Cloudinary -------------------------------------------------------------
+
+class FakeUploader:
+    def __init__(self, service: FakeService):
+        self.service = service
+        self.bytes_uploaded = 0
+        self._lock = threading.Lock()
+
+    def upload(self, path, public_id=None, **options):
+        size = os.path.getsize(path)
+        self.service.request()
+        with self._lock:
+            self.bytes_uploaded += size
+        return {'secure_url': f"https://res.cloudinary.invalid/{public_id}.jpg", 'bytes': size}
+
+# --- wholeearth.info (scraper) ----------------------------------------------
+
+class FakeHTTPResponse:
+    def __init__(self, status_code: int, body: bytes):
+        self.status_code = status_code
+        self.content = body
+        self.text = body.decode('utf-8', errors='replace')
+
+    def iter_content(self, chunk_size: int = 8192):
+        for start in range(0, len(self.content), chunk_size):
+            yield self.content[start:start + chunk_size]
+
+class FakeSite:
+    """Serves an index page linking to issue pages, and the issues' PDFs"""
+
+    BASE = 'https://wholeearth.info'
+
+    def __init__(self, service: FakeService, pdf_bytes: Dict[str, bytes]):
+        self.service = service
+        self.pdf_bytes = pdf_bytes
+
+    def get(self, url, **kwargs):
+        self.service.request()
+        if url.rstrip('/') == self.BASE:
+            links = ''.join(f'<a href="/p/{Path(name).stem}">{name}</a>' for name in self.pdf_bytes)
+            return FakeHTTPResponse(200, f"<html><body>{links}</body></html>".encode())
+        name = url.rsplit('/', 1)[-1]
+        if name in self.pdf_bytes:
+            return FakeHTTPResponse(200, self.pdf_bytes[name])
+        return FakeHTTPResponse(404, b'')
+
+    def make_driver(self, *args, **kwargs):
+        return FakeDriver(self)
+
+class FakeElement:
+    def __init__(self, href: str):
+        self.href = href
+        self.text = 'Download PDF'
+
+    def get_attribute(self, name: str):
+        return self.href if name == 'href' else None
+
+class FakeDriver:
+    """Just enough of a Selenium Chrome driver for scrape-and-download.py"""
+
+    def __init__(self, site: FakeSite):
+        self.site = site
+        self.current_url = None
+
+    def get(self, url: str):
+        self.site.service.request()
+        self.current_url = url
+
+    def find_element(self, by=None, value=None):
+        stem = self.current_url.rstrip('/').rsplit('/', 1)[-1]
+        return FakeElement(f"{FakeSite.BASE}/pdfs/{stem}.pdf")
+
+    def quit(self):
+        pass
+
+# --- Synthetic corpus -------------------------------------------------------
+
+def make_corpus(directory: Path, issues: int, pages: int, seed: int = 0,
+                blank_fraction: float = 0.05, repeat_fraction: float = 0.05) -> List[Path]:
+    """
+    Write synthetic issue PDFs: pages of word blocks in columns, with some
+    blank pages and a repeated order-form page, at 100 DPI letter size.
+    """
+    from PIL import Image, ImageDraw
+
+    rng = random.Random(seed)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    def text_page(page_rng):
+        image = Image.new('RGB', (850, 1100), 'white')
+        draw = ImageDraw.Draw(image)
+        for column in range(2):
+            y = 60
+            while y < 1040:
+                line = ' '.join(page_rng.choice(WORDS) for _ in range(page_rng.randint(3, 6)))
+                draw.text((60 + column * 400, y), line, fill='black')
+                y += page_rng.choice([14, 14, 14, 28])
+        return image
+
+    repeated = text_page(random.Random(seed - 1))
+    paths = []
+    for issue in range(1, issues + 1):
+        images = []
+        for _ in range(pages):
+            roll = rng.random()
+            if roll < blank_fraction:
+                images.append(Image.new('RGB', (850, 1100), 'white'))
+            elif roll < blank_fraction + repeat_fraction:
+                images.append(repeated.copy())
+            else:
+                images.append(text_page(random.Random(rng.random())))
+        path = directory / f"synthetic-{issue:03}.pdf"
+        images[0].save(path, 'PDF', resolution=100.0, save_all=True, append_images=images[1:])
+        for image in images:
+            image.close()
+        paths.append(path)
+    return paths
+
+# --- Harness ----------------------------------------------------------------
+
+def _load_fresh(filename: str):
+    """Import a processing script from scratch so it picks up the installed fakes"""
+    module_name = Path(filename).stem.replace('-', '_')
+    spec = importlib.util.spec_from_file_location(module_name, HERE / filename)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    return module
+
+@contextlib.contextmanager
+def installed_fakes(modules: Dict[str, types.ModuleType], env: Dict[str, str]):
+    """Temporarily replace sys.modules entries and environment variables"""
+    saved_modules = {name: sys.modules.get(name) for name in modules}
+    saved_env = {name: os.environ.get(name) for name in env}
+    sys.modules.update(modules)
+    os.environ.update(env)
+    try:
+        yield
+    finally:
+        for name, module in saved_modules.items():
+            if module is None:
+                sys.modules.pop(name, None)
+            else:
+                sys.modules[name] = module
+        for name, value in saved_env.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+def _fake_module(name: str, **attributes) -> types.ModuleType:
+    module = types.ModuleType(name)
+    module.__dict__.update(attributes)
+    return module
+
+def _service_modules(services: Dict[str, FakeService], gemini_empty_rate: float):
+    """Fake google.generativeai, supabase and cloudinary modules wired to the services"""
+    supabase_client = FakeSupabase(services['supabase'])
+    uploader = FakeUploader(services['cloudinary'])
+    model = FakeGenerativeModel(services['gemini'], gemini_empty_rate)
+
+    genai = _fake_module('google.generativeai', configure=lambda **kwargs: None,
+                         GenerativeModel=lambda *args, **kwargs: model)
+    # A fresh parent package, so `import google.generativeai` can't resolve to the real one
+    google = _fake_module('google', generativeai=genai)
+    cloudinary_uploader = _fake_module('cloudinary.uploader', upload=uploader.upload)
+    cloudinary = _fake_module('cloudinary', config=lambda **kwargs: None, uploader=cloudinary_uploader)
+    supabase = _fake_module('supabase', create_client=lambda *args, **kwargs: supabase_client,
+                            Client=FakeSupabase)
+
+    modules = {
+        'google': google,
+        'google.generativeai': genai,
+        'cloudinary': cloudinary,
+        'cloudinary.uploader': cloudinary_uploader,
+        'supabase': supabase,
+    }
+    return modules, supabase_client, uploader
+
+def _memory_peak_bytes() -> int:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS and kilobytes on Linux
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+def run_scenario(scenario: str, services: Dict[str, FakeService], workdir: Path, issues: int,
+                 pages: int, workers: Optional[int], seed: int, gemini_empty_rate: float,
+                 adaptive_dpi: bool = False, timeout: float = 600) -> dict:
+    """Run one script end to end against the fakes and collect metrics"""
+    modules, supabase_client, uploader = _service_modules(services, gemini_empty_rate)
+    env = {'SUPABASE_URL': 'http://supabase.invalid', 'SUPABASE_KEY': 'fake',
+           'GOOGLE_API_KEY': 'fake', 'CLOUDINARY_CLOUD_NAME': 'fake'}
+    if workers:
+        env.update({'OCR_MAX_WORKERS': str(workers), 'UPLOAD_MAX_WORKERS': str(workers),
+                    'SCRAPE_WORKERS': str(workers)})
+    if adaptive_dpi:
+        env['OCR_ADAPTIVE_DPI'] = '1'
+
+    previous_cwd = os.getcwd()
+    os.chdir(workdir)
+    corpus = make_corpus(workdir / 'WECs', issues, pages, seed)
+    page_total = issues * pages
+    result = {'scenario': scenario, 'issues': issues, 'pages': page_total}
+
+    if scenario == 'images':
+        # upload-images works on pages that were already OCR'd
+        for pdf_path in corpus:
+            issue_id = str(uuid.uuid4())
+            supabase_client.tables['issue'].append({'id': issue_id, 'filename': pdf_path.name, 'num_pages': pages})
+            for page_number in range(1, pages + 1):
+                supabase_client.tables['page'].append({
+                    'id': str(uuid.uuid4()), 'parent_issue_id': issue_id, 'page_number': str(page_number),
+                    'ocr_result': 'text', 'error': False, 'image_url': None,
+                })
+
+    def drive():
+        if scenario == 'ocr':
+            # adaptive_ocr reads its settings at import time
+            sys.modules.pop('adaptive_ocr', None)
+            ocr = _load_fresh('gemini_page_ocr.py')
+            ocr.process_directory('WECs')
+            result['hedging'] = ocr.gemini_requests.stats()
+            result['retries'] = ocr.retries['count']
+            if adaptive_dpi:
+                result['adaptive'] = ocr.tier_stats.summary()
+            ocr.gemini_requests.shutdown()
+        elif scenario == 'batch':
+            # Bulk mode through the local backend, whose model is the fake
+            sys.modules.pop('adaptive_ocr', None)
+            sys.modules.pop('gemini_page_ocr', None)
+            batch = _load_fresh('batch_ocr.py')
+            batch.prepare('WECs')
+            batch.run('local', wait=False)
+            ocr = batch.load_ocr()
+            result['hedging'] = ocr.gemini_requests.stats()
+            result['retries'] = ocr.retries['count']
+            result['batch'] = batch.compare()
+            ocr.gemini_requests.shutdown()
+        elif scenario == 'images':
+            _load_fresh('upload-images.py').process_pdfs('WECs')
+        elif scenario == 'scrape':
+            # Serve the synthetic PDFs from the fake site, then let the scraper download them again
+            pdf_bytes = {path.name: path.read_bytes() for path in corpus}
+            for path in corpus:
+                path.unlink()
+            site = FakeSite(services['site'], pdf_bytes)
+            import requests
+            from selenium import webdriver
+            with _patched(requests, 'get', site.get), _patched(webdriver, 'Chrome', site.make_driver):
+                _load_fresh('scrape-and-download.py').main()
+
+    stdout = io.StringIO()
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        with installed_fakes(modules, env), contextlib.redirect_stdout(stdout):
+            _run_with_timeout(drive, timeout)
+    finally:
+        elapsed = time.perf_counter() - start
+        _, traced_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        os.chdir(previous_cwd)
+        sys.modules.pop('adaptive_ocr', None)
+        sys.modules.pop('gemini_page_ocr', None)
+
+    pages_table = supabase_client.tables['page']
+    if scenario in ('ocr', 'batch'):
+        done = len(pages_table)
+        result['pages_done'] = done
+        result['pages_with_errors'] = sum(1 for row in pages_table if row.get('error'))
+    elif scenario == 'images':
+        done = sum(1 for row in pages_table if row.get('image_url'))
+        result['pages_done'] = done
+        result['bytes_uploaded'] = uploader.bytes_uploaded
+    else:
+        done = len(list((workdir / 'WECs').glob('*.pdf')))
+        result['issues_downloaded'] = done
+
+    result['seconds'] = elapsed
+    result['throughput_per_second'] = done / elapsed if elapsed else 0.0
+    result['services'] = {name: service.summary() for name, service in services.items() if service.counts['calls']}
+    result['peak_python_bytes'] = traced_peak
+    result['peak_rss_bytes'] = _memory_peak_bytes()
+    result['log_lines'] = len(stdout.getvalue().splitlines())
+    return result
+
+def _run_with_timeout(fn, timeout: float):
+    """Run fn on a daemon thread; raises TimeoutError if it hasn't returned in time"""
+    outcome = {}
+
+    def target():
+        try:
+            fn()
+        except BaseException as e:
+            outcome['error'] = e
+
+    thread = threading.Thread(target=target, name='scenario', daemon=True)
+    thread.start()
+    thread.join(timeout)
+    if thread.is_alive():
+        raise TimeoutError(f"Scenario still running after {timeout:g}s; the script under test is stuck")
+    if 'error' in outcome:
+        raise outcome['error']
+
+@contextlib.contextmanager
+def _patched(target, attribute: str, value):
+    original = getattr(target, attribute)
+    setattr(target, attribute, value)
+    try:
+        yield
+    finally:
+        setattr(target, attribute, original)
+
+def print_report(result: dict):
+    def fmt(seconds):
+        return "n/a" if seconds is None else f"{seconds:.3f}s"
+
+    unit = 'issues' if result['scenario'] == 'scrape' else 'pages'
+    done = result.get('issues_downloaded', result.get('pages_done'))
+    total = result['issues'] if unit == 'issues' else result['pages']
+    print(f"Scenario: {result['scenario']}")
+    print(f"Completed {done}/{total} {unit} in {result['seconds']:.1f}s "
+          f"({result['throughput_per_second']:.2f} {unit}/s)")
+    if 'pages_with_errors' in result:
+        print(f"Pages stored as errors: {result['pages_with_errors']}")
+    if 'retries' in result:
+        print(f"Retries: {result['retries']}")
+    if 'adaptive' in result:
+        adaptive = result['adaptive']
+        print(f"Adaptive resolution: {adaptive['low_only']} low DPI only, {adaptive['escalated']} escalated "
+              f"{adaptive['escalations']}, {adaptive['fallbacks']} kept low-DPI text after a failed retry; "
+              f"{adaptive['pixel_reduction']:.1%} fewer pixels, "
+              f"~{adaptive['byte_reduction']:.1%} fewer bytes")
+    if result.get('batch'):
+        batch = result['batch']
+        print(f"Batch: ~{batch['input_tokens']:,} input, ~{batch['output_tokens']:,} output tokens; "
+              f"${batch['online_cost']:.4f} at online prices, ${batch['batch_cost']:.4f} at batch prices")
+    if 'hedging' in result:
+        hedging = result['hedging']
+        print(f"Hedged: {hedging['hedges']} ({hedging['hedge_rate']:.1%}), {hedging['hedge_wins']} wins, "
+              f"{hedging['timeouts']} timeouts; recent OCR call latency p50 {fmt(hedging['p50'])}, "
+              f"p90 {fmt(hedging['p90'])}, p99 {fmt(hedging['p99'])}")
+    for name, summary in result['services'].items():
+        print(f"  {name}: {summary['calls']} calls, {summary['errors']} errors, "
+              f"{summary['rate_limited']} rate limited; latency p50 {fmt(summary['p50'])}, "
+              f"p90 {fmt(summary['p90'])}, p99 {fmt(summary['p99'])}")
+    print(f"Peak memory: {result['peak_python_bytes'] / 1e6:.1f} MB Python heap, "
+          f"{result['peak_rss_bytes'] / 1e6:.1f} MB process RSS")
+
+def _per_service(values: List[str], cast) -> Dict[str, object]:
+    parsed = {}
+    for value in values or []:
+        name, _, setting = value.partition('=')
+        if name not in DEFAULT_LATENCY:
+            raise SystemExit(f"Unknown service '{name}', expected one of {', '.join(DEFAULT_LATENCY)}")
+        parsed[name] = cast(setting)
+    return parsed
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Offline load test of the ingestion scripts")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    corpus_parser = subparsers.add_parser('corpus', help="only write a synthetic PDF corpus")
+    corpus_parser.add_argument('directory', type=Path)
+    corpus_parser.add_argument('--issues', type=int, default=3)
+    corpus_parser.add_argument('--pages', type=int, default=12)
+    corpus_parser.add_argument('--seed', type=int, default=0)
+
+    for scenario, help_text in [('ocr', "gemini_page_ocr.py"), ('batch', "batch_ocr.py with the local backend"),
+                                ('images', "upload-images.py"), ('scrape', "scrape-and-download.py")]:
+        scenario_parser = subparsers.add_parser(scenario, help=f"load test {help_text}")
+        scenario_parser.add_argument('--issues', type=int, default=3)
+        scenario_parser.add_argument('--pages', type=int, default=12)
+        scenario_parser.add_argument('--workers', type=int, help="override the script's worker count")
+        scenario_parser.add_argument('--latency', action='append', metavar='SERVICE=SPEC')
+        scenario_parser.add_argument('--error-rate', action='append', metavar='SERVICE=F')
+        scenario_parser.add_argument('--rate-429', action='append', metavar='SERVICE=F')
+        scenario_parser.add_argument('--rps', action='append', metavar='SERVICE=N')
+        scenario_parser.add_argument('--gemini-empty-rate', type=float, default=0.0,
+                                     help="fraction of empty (copyright-blocked) responses")
+        scenario_parser.add_argument('--adaptive-dpi', action='store_true',
+                                     help="run OCR in two-tier resolution mode")
+        scenario_parser.add_argument('--time-scale', type=float, default=1.0)
+        scenario_parser.add_argument('--timeout', type=float, default=600,
+                                     help="fail if the script hasn't finished after this many seconds")
+        scenario_parser.add_argument('--seed', type=int, default=0)
+        scenario_parser.add_argument('--json', type=Path, help="also write the metrics here")
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'corpus':
+        for path in make_corpus(args.directory, args.issues, args.pages, args.seed):
+            print(f"Wrote {path}")
+        return
+
+    latency = {**DEFAULT_LATENCY, **_per_service(args.latency, str)}
+    error_rates = _per_service(args.error_rate, float)
+    rates_429 = _per_service(args.rate_429, float)
+    rps = _per_service(args.rps, float)
+    services = {
+        name: FakeService(
+            name,
+            LatencyModel(latency[name], args.time_scale, random.Random(args.seed + index)),
+            error_rate=error_rates.get(name, 0.0),
+            rate_429=rates_429.get(name, 0.0),
+            rps=rps.get(name),
+            seed=args.seed + index,
+        )
+        for index, name in enumerate(DEFAULT_LATENCY)
+    }
+
+    with tempfile.TemporaryDirectory(prefix='wec-loadtest-') as workdir:
+        result = run_scenario(args.command, services, Path(workdir), args.issues, args.pages,
+                              args.workers, args.seed, args.gemini_empty_rate, args.adaptive_dpi,
+                              args.timeout)
+    print_report(result)
+    if args.json:
+        args.json.write_text(json.dumps(result, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,7 @@ import os
 from pathlib import Path
 from supabase import create_client, Client
 from dotenv import load_dotenv
+import mirror
 
 # Load environment variables and initialize Supabase client
 load_dotenv()
@@ -19,10 +20,10 @@ def save_concatenated_pages():
     output_dir = Path("OCR-results")
     output_dir.mkdir(exist_ok=True)
     
-    # Get all issues
-    issues = supabase.table('issue').select('*').execute()
+    # Sync the local mirror, then get all issues with their page counts in one query
+    conn = mirror.sync(supabase)
     
-    for issue in issues.data:
+    for issue in mirror.issue_page_counts(conn):
         issue_id = issue['id']
         filename = issue['filename']
         # Strip .pdf from filename for output
@@ -34,13 +35,7 @@ def save_concatenated_pages():
             print(f"✓ {filename}: Output file already exists")
             continue
             
-        # Get count of all pages in database for this issue
-        pages = supabase.table('page')\
-            .select('*')\
-            .eq('parent_issue_id', issue_id)\
-            .execute()
-            
-        db_page_count = len(pages.data)
+        db_page_count = issue['db_page_count']
         
         # Update issue record if num_pages is None
         if issue['num_pages'] is None:
@@ -48,27 +43,26 @@ def save_concatenated_pages():
                 .update({'num_pages': db_page_count})\
                 .eq('id', issue_id)\
                 .execute()
+            mirror.update_issue(conn, issue_id, num_pages=db_page_count)
             print(f"Updated {filename} with correct page count: {db_page_count}")
         # Skip only if page counts don't match and num_pages is not None
         elif db_page_count != issue['num_pages']:
             print(f"Skipping {filename}: Have {db_page_count} pages, expected {issue['num_pages']}")
             continue
             
-        # Get all non-error pages for this issue, ordered by page number
-        valid_pages = supabase.table('page')\
-            .select('*')\
-            .eq('parent_issue_id', issue_id)\
-            .eq('error', False)\
-            .order('page_number')\
-            .execute()
+        # Get all non-error pages for this issue, in the same page order as the full-text archive
+        valid_pages = sorted(conn.execute("""
+            select page_number, ocr_result from page
+            where parent_issue_id = ? and not error
+        """, (issue_id,)).fetchall(), key=lambda page: mirror.page_sort_key(page['page_number']))
             
-        if not valid_pages.data:
+        if not valid_pages:
             print(f"No valid pages found for issue {filename}")
             continue
             
         # Concatenate page contents in order
         full_text = ""
-        for page in valid_pages.data:
+        for page in valid_pages:
             # Remove ```text annotations if present
             cleaned_text = page['ocr_result'].replace('```text', '')
             full_text += cleaned_text + "\n"
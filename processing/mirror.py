@@ -0,0 +1,275 @@
+"""
+Local SQLite mirror of the issue and page tables for audit and reporting scripts.
+
+    python mirror.py sync [--full]
+    python mirror.py stats
+
+The issue table is small and its rows get edited (metadata, num_pages), so it
+is re-read in full on every sync. Pages are append-mostly, so they are synced
+incrementally: rows are read in (created_at, id) order with keyset pagination,
+starting OVERLAP_SECONDS before the last row already mirrored. Concurrent
+inserts (the OCR workers) can commit out of created_at order, and the overlap
+picks up rows that landed behind the watermark after the previous sync.
+After reading, the pages up to the watermark are counted on both sides; rows
+inserted after it (OCR workers running during the sync) are left for the next
+sync rather than counted as drift. If the counts differ, one more incremental
+pass runs, and if they still differ (pages were deleted, e.g. to be re-OCR'd,
+or a row committed later than the overlap), the page table is re-read in
+full. In-place page edits such as image_url are not picked up by an
+incremental sync; use --full when those matter.
+
+The mirror also caches the page count of each local PDF, keyed by the file's
+size and modification time, so audits don't re-parse unchanged catalogs.
+"""
+import argparse
+import os
+import sqlite3
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import List, Optional
+
+MIRROR_PATH = Path("mirror.db")
+PAGE_SIZE = 1000
+# How far behind the watermark each incremental page sync starts again
+OVERLAP_SECONDS = 600
+# Sorts before every uuid, so the overlap includes all rows at its start time
+MIN_UUID = '00000000-0000-0000-0000-000000000000'
+
+ISSUE_COLUMNS = [
+    'id', 'filename', 'created_at', 'num_pages', 'issue_url', 'description',
+    'pdf_download', 'internet_archive', 'collection', 'pub_date',
+]
+PAGE_COLUMNS = [
+    'id', 'parent_issue_id', 'page_number', 'ocr_result', 'error', 'image_url', 'created_at',
+]
+
+SCHEMA = """
+create table if not exists issue (
+    id text primary key,
+    filename text,
+    created_at text,
+    num_pages integer,
+    issue_url text,
+    description text,
+    pdf_download text,
+    internet_archive text,
+    collection text,
+    pub_date text
+);
+
+create table if not exists page (
+    id text primary key,
+    parent_issue_id text,
+    page_number text,
+    ocr_result text,
+    error integer,
+    image_url text,
+    created_at text
+);
+
+create index if not exists page_parent_issue_idx on page (parent_issue_id);
+create index if not exists page_created_at_idx on page (created_at, id);
+
+create table if not exists pdf_page_count (
+    filename text primary key,
+    fingerprint text,
+    page_count integer
+);
+
+create table if not exists sync_state (
+    table_name text primary key,
+    created_at text,
+    id text,
+    synced_at real
+);
+"""
+
+def connect(path: Path = MIRROR_PATH) -> sqlite3.Connection:
+    """Open the mirror, creating its schema if needed"""
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    conn.executescript(SCHEMA)
+    return conn
+
+def create_supabase_client():
+    """Supabase client from the environment, for callers that don't already have one"""
+    from dotenv import load_dotenv
+    from supabase import create_client
+
+    load_dotenv()
+    return create_client(os.getenv('SUPABASE_URL'), os.getenv('SUPABASE_KEY'))
+
+def _upsert(conn: sqlite3.Connection, table: str, columns: List[str], rows: List[dict]):
+    placeholders = ', '.join('?' for _ in columns)
+    conn.executemany(
+        f"insert or replace into {table} ({', '.join(columns)}) values ({placeholders})",
+        [tuple(row.get(column) for column in columns) for row in rows],
+    )
+
+def _sync_issues(supabase, conn: sqlite3.Connection) -> int:
+    """Re-read the whole issue table, one keyset page at a time"""
+    rows = []
+    last_id = None
+    while True:
+        query = supabase.table('issue').select(', '.join(ISSUE_COLUMNS)).order('id').limit(PAGE_SIZE)
+        if last_id is not None:
+            query = query.gt('id', last_id)
+        batch = query.execute().data
+        rows.extend(batch)
+        if len(batch) < PAGE_SIZE:
+            break
+        last_id = batch[-1]['id']
+
+    with conn:
+        conn.execute("delete from issue")
+        _upsert(conn, 'issue', ISSUE_COLUMNS, rows)
+    return len(rows)
+
+def _sync_pages(supabase, conn: sqlite3.Connection, full: bool) -> int:
+    """Read pages created after the watermark, in (created_at, id) order"""
+    if full:
+        with conn:
+            conn.execute("delete from page")
+            conn.execute("delete from sync_state where table_name = 'page'")
+
+    state = conn.execute("select created_at, id from sync_state where table_name = 'page'").fetchone()
+    last_created_at, last_id = (None, None)
+    if state:
+        # Re-read a window behind the watermark; upserts make the overlap harmless
+        overlap_start = datetime.fromisoformat(state['created_at']) - timedelta(seconds=OVERLAP_SECONDS)
+        last_created_at, last_id = overlap_start.isoformat(), MIN_UUID
+
+    synced = 0
+    while True:
+        query = supabase.table('page')\
+            .select(', '.join(PAGE_COLUMNS))\
+            .order('created_at')\
+            .order('id')\
+            .limit(PAGE_SIZE)
+        if last_created_at is not None:
+            # Strictly after (created_at, id); values are quoted because timestamps contain ':' and '+'
+            query = query.or_(
+                f'created_at.gt."{last_created_at}",'
+                f'and(created_at.eq."{last_created_at}",id.gt."{last_id}")'
+            )
+        batch = query.execute().data
+        if not batch:
+            break
+
+        last_created_at, last_id = batch[-1]['created_at'], batch[-1]['id']
+        with conn:
+            _upsert(conn, 'page', PAGE_COLUMNS, batch)
+            conn.execute(
+                "insert or replace into sync_state (table_name, created_at, id, synced_at) values ('page', ?, ?, ?)",
+                (last_created_at, last_id, time.time()),
+            )
+        synced += len(batch)
+        if len(batch) < PAGE_SIZE:
+            break
+
+    return synced
+
+def sync(supabase=None, conn: Optional[sqlite3.Connection] = None, full: bool = False) -> sqlite3.Connection:
+    """Bring the mirror up to date with Supabase and return a connection to it"""
+    supabase = supabase or create_supabase_client()
+    conn = conn or connect()
+
+    start = time.perf_counter()
+    issue_count = _sync_issues(supabase, conn)
+    new_pages = _sync_pages(supabase, conn, full)
+
+    if not full:
+        def counts():
+            """Pages created up to the watermark on each side; later inserts aren't drift"""
+            state = conn.execute("select created_at from sync_state where table_name = 'page'").fetchone()
+            if state is None:
+                return None, 0
+            remote = supabase.table('page').select('id', count='exact')\
+                .lte('created_at', state['created_at']).limit(1).execute().count
+            local = conn.execute("select count(*) from page where created_at <= ?",
+                                 (state['created_at'],)).fetchone()[0]
+            return remote, local
+
+        # Deleted pages and rows committed behind the overlap never show up past the
+        # watermark. Catch up once first, in case they are still within the overlap.
+        remote_count, local_count = counts()
+        if remote_count is not None and remote_count != local_count:
+            new_pages += _sync_pages(supabase, conn, full=False)
+            remote_count, local_count = counts()
+        if remote_count is not None and remote_count != local_count:
+            print(f"Mirror has {local_count} pages up to its watermark but Supabase has {remote_count}, "
+                  f"re-reading all pages")
+            new_pages = _sync_pages(supabase, conn, full=True)
+
+    print(f"Mirror synced in {time.perf_counter() - start:.2f}s: {issue_count} issues, {new_pages} pages read")
+    return conn
+
+def page_sort_key(page_number: str):
+    """Page numbers are stored as text; numeric ones first in numeric order, then the rest by text"""
+    return (0, int(page_number), '') if page_number.isdigit() else (1, 0, page_number)
+
+def pdf_page_count(conn: sqlite3.Connection, pdf_path: Path) -> int:
+    """Pages in a local PDF, parsed only when the file changed since it was last counted"""
+    stat = Path(pdf_path).stat()
+    # Same size and mtime fingerprint as pipeline.file_fingerprint
+    fingerprint = f"{stat.st_size}:{stat.st_mtime_ns}"
+    row = conn.execute("select fingerprint, page_count from pdf_page_count where filename = ?",
+                       (Path(pdf_path).name,)).fetchone()
+    if row and row['fingerprint'] == fingerprint:
+        return row['page_count']
+
+    import PyPDF2
+    with open(pdf_path, 'rb') as f:
+        page_count = len(PyPDF2.PdfReader(f).pages)
+    with conn:
+        conn.execute("insert or replace into pdf_page_count (filename, fingerprint, page_count) values (?, ?, ?)",
+                     (Path(pdf_path).name, fingerprint, page_count))
+    return page_count
+
+def update_issue(conn: sqlite3.Connection, issue_id: str, **fields):
+    """Apply an update already written to Supabase to the mirrored issue row"""
+    assignments = ', '.join(f"{column} = ?" for column in fields)
+    with conn:
+        conn.execute(f"update issue set {assignments} where id = ?", (*fields.values(), issue_id))
+
+def issue_page_counts(conn: sqlite3.Connection) -> List[sqlite3.Row]:
+    """Every issue with its number of mirrored pages and error pages"""
+    return conn.execute("""
+        select issue.*,
+               count(page.id) as db_page_count,
+               coalesce(sum(page.error), 0) as error_page_count
+        from issue
+        left join page on page.parent_issue_id = issue.id
+        group by issue.id
+        order by issue.filename
+    """).fetchall()
+
+def show_stats(conn: sqlite3.Connection):
+    issues, pages, errors = conn.execute("""
+        select (select count(*) from issue),
+               count(*),
+               coalesce(sum(error), 0)
+        from page
+    """).fetchone()
+    state = conn.execute("select created_at, synced_at from sync_state where table_name = 'page'").fetchone()
+    print(f"Issues: {issues}")
+    print(f"Pages: {pages} ({errors} with errors)")
+    if state:
+        print(f"Page watermark: {state['created_at']} (synced {time.ctime(state['synced_at'])})")
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Local SQLite mirror of the issue and page tables")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    sync_parser = subparsers.add_parser('sync', help="pull new rows from Supabase")
+    sync_parser.add_argument('--full', action='store_true', help="re-read every page")
+    subparsers.add_parser('stats', help="summarize the mirror without syncing")
+    args = parser.parse_args(argv)
+
+    if args.command == 'sync':
+        show_stats(sync(full=args.full))
+    elif args.command == 'stats':
+        show_stats(connect())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,367 @@
+"""
+Perceptual-hash index of rendered pages, used to skip OCR for blank and
+near-duplicate pages (repeated covers, order forms, reprinted sections).
+
+    python page_dedup.py index [--distance N] [--blank-ink F] [--max-difference F]
+    python page_dedup.py report
+    python page_dedup.py tune [--max-distance N] [--max-difference F]
+
+`index` renders every page at a low DPI and stores two difference hashes and
+the page's ink coverage in page-hashes.db, then groups pages across the whole
+corpus: pages with no ink at all are blank, and a page within `--distance`
+bits of an earlier page (in filename, page order) is a duplicate of it if
+their detail hashes also agree. PDFs whose size and mtime haven't changed
+since they were hashed are skipped; a changed PDF has its pages hashed again.
+
+The 256-bit hash finds candidates and tolerates small shifts between scans,
+but it is too coarse to tell pages apart that share a layout: columns of
+text, or a few lines on an otherwise empty page, reduce to the same blurred
+shapes. The 2304-bit detail hash is compared as the share of differing bits
+among the bits set in either page, which doesn't depend on how much ink
+there is: a slightly shifted, rotated or re-exposed copy of a page differs
+in about a third of them, different pages of the harness corpus (`loadtest.py
+corpus`) in more than half.
+
+Ink is counted as pixels clearly darker than the paper (the page's median
+brightness), not as pixels darker than mid-grey: at HASH_DPI text blurs to
+light grey, and a full page of small type has almost no pixels below 128.
+Paper tone and scanner noise stay within MARK_CONTRAST of the paper, so only
+a truly empty page is blank.
+
+gemini_page_ocr consults the index and stores the earlier page's
+transcription instead of calling Gemini. Blank pages are stored as error
+rows with BLANK_ERROR as their text, so they stay out of the exports and
+the frontend like any failed page and can be found and re-OCR'd with
+`ocr_result = 'ERROR: ' || BLANK_ERROR`.
+
+The index is derived data: when SCHEMA_VERSION changes, the old table is
+dropped and every page is hashed again.
+
+`tune` shows how the number of flagged pages changes with the thresholds and,
+using transcriptions from the local mirror, how often pages flagged as
+duplicates really have the same text.
+"""
+import argparse
+import difflib
+import sqlite3
+from collections import namedtuple
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+HASH_DB_PATH = Path("page-hashes.db")
+HASH_DPI = 40
+HASH_SIZE = 16
+DUPLICATE_DISTANCE = 12
+DETAIL_HASH_SIZE = 48
+# Largest share of differing detail-hash bits between a duplicate and its canonical page
+MAX_DETAIL_DIFFERENCE = 0.45
+# Pixels more than this many grey levels darker than the paper count as ink
+MARK_CONTRAST = 32
+# A single short line of text is about 0.1% ink at HASH_DPI; dust specks stay far below this
+BLANK_INK = 0.0002
+# Error stored for blank pages instead of a transcription
+BLANK_ERROR = "Blank page, not sent to OCR (page_dedup)"
+# Bump when the stored hashes or ink measure change
+SCHEMA_VERSION = 2
+
+Match = namedtuple('Match', ['kind', 'filename', 'page_number', 'distance'])
+
+SCHEMA = """
+create table if not exists page_hash (
+    filename text,
+    page_number integer,
+    hash text,
+    detail text,
+    ink real,
+    kind text,
+    canonical_filename text,
+    canonical_page integer,
+    distance integer,
+    primary key (filename, page_number)
+);
+
+create table if not exists hashed_pdf (
+    filename text primary key,
+    fingerprint text
+);
+"""
+
+def dhash(image, hash_size: int = HASH_SIZE) -> int:
+    """Difference hash: one bit per horizontally adjacent pixel pair of a tiny grayscale copy"""
+    small = image.convert('L').resize((hash_size + 1, hash_size))
+    pixels = list(small.getdata())
+    value = 0
+    for row in range(hash_size):
+        for col in range(hash_size):
+            left = pixels[row * (hash_size + 1) + col]
+            right = pixels[row * (hash_size + 1) + col + 1]
+            value = (value << 1) | (left > right)
+    return value
+
+def ink_coverage(image, threshold: int = 128) -> float:
+    """Fraction of pixels darker than threshold"""
+    histogram = image.convert('L').histogram()
+    total = sum(histogram)
+    return sum(histogram[:threshold]) / total if total else 0.0
+
+def marked_coverage(image, contrast: int = MARK_CONTRAST) -> float:
+    """Fraction of pixels more than contrast grey levels darker than the paper"""
+    histogram = image.convert('L').histogram()
+    total = sum(histogram)
+    if not total:
+        return 0.0
+    # The paper is the median brightness: even a dense page is mostly background
+    seen = 0
+    for paper, count in enumerate(histogram):
+        seen += count
+        if seen * 2 >= total:
+            break
+    return sum(histogram[:max(0, paper - contrast)]) / total
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count('1')
+
+class BKTree:
+    """Burkhard-Keller tree over hashes for radius queries in Hamming distance"""
+
+    def __init__(self):
+        self._root = None
+
+    def add(self, value: int, item):
+        if self._root is None:
+            self._root = (value, item, {})
+            return
+        node = self._root
+        while True:
+            distance = hamming(value, node[0])
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = (value, item, {})
+                return
+            node = child
+
+    def nearest(self, value: int, radius: int, accept=None) -> Optional[Tuple[int, object]]:
+        """(distance, item) of the closest entry within radius that accept(item) allows, or None"""
+        best = None
+        stack = [self._root] if self._root else []
+        while stack:
+            node_value, item, children = stack.pop()
+            distance = hamming(value, node_value)
+            if distance <= radius and (best is None or distance < best[0]) and (accept is None or accept(item)):
+                best = (distance, item)
+            for child_distance, child in children.items():
+                if distance - radius <= child_distance <= distance + radius:
+                    stack.append(child)
+        return best
+
+def connect(path: Path = HASH_DB_PATH) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    if conn.execute("pragma user_version").fetchone()[0] != SCHEMA_VERSION:
+        with conn:
+            conn.execute("drop table if exists page_hash")
+            conn.execute("drop table if exists hashed_pdf")
+        conn.execute(f"pragma user_version = {SCHEMA_VERSION}")
+    conn.executescript(SCHEMA)
+    return conn
+
+def index_pdf(conn: sqlite3.Connection, pdf_path: Path) -> int:
+    """Hash every page of a PDF unless it is unchanged since it was last hashed; returns pages hashed"""
+    from pdf2image import convert_from_path
+
+    filename = Path(pdf_path).name
+    stat = Path(pdf_path).stat()
+    # Same size and mtime fingerprint as pipeline.file_fingerprint
+    fingerprint = f"{stat.st_size}:{stat.st_mtime_ns}"
+    hashed = conn.execute("select fingerprint from hashed_pdf where filename = ?", (filename,)).fetchone()
+    if hashed and hashed['fingerprint'] == fingerprint:
+        return 0
+
+    # At this DPI a whole issue fits comfortably in memory and renders in one poppler call
+    images = convert_from_path(str(pdf_path), dpi=HASH_DPI)
+    rows = []
+    for page_number, image in enumerate(images, start=1):
+        rows.append((filename, page_number, format(dhash(image), 'x'),
+                     format(dhash(image, DETAIL_HASH_SIZE), 'x'), marked_coverage(image)))
+        image.close()
+
+    # Drop the old hashes: the PDF may have lost pages or had them replaced
+    with conn:
+        conn.execute("delete from page_hash where filename = ?", (filename,))
+        conn.executemany(
+            "insert into page_hash (filename, page_number, hash, detail, ink) values (?, ?, ?, ?, ?)",
+            rows,
+        )
+        conn.execute("insert or replace into hashed_pdf (filename, fingerprint) values (?, ?)",
+                     (filename, fingerprint))
+    return len(rows)
+
+def _load_hashes(conn: sqlite3.Connection):
+    return conn.execute(
+        "select filename, page_number, hash, detail, ink from page_hash order by filename, page_number"
+    ).fetchall()
+
+def detail_difference(a: int, b: int) -> float:
+    """Share of differing bits among the bits set in either detail hash"""
+    union = bin(a | b).count('1')
+    return hamming(a, b) / union if union else 0.0
+
+def classify(rows, distance: int, blank_ink: float,
+             max_difference: float = MAX_DETAIL_DIFFERENCE) -> Dict[Tuple[str, int], Match]:
+    """Blank and duplicate pages among rows, keyed by (filename, page_number)"""
+    tree = BKTree()
+    matches = {}
+    for row in rows:
+        key = (row['filename'], row['page_number'])
+        if row['ink'] < blank_ink:
+            matches[key] = Match('blank', None, None, None)
+            continue
+        value = int(row['hash'], 16)
+        detail = int(row['detail'], 16)
+        nearest = tree.nearest(value, distance,
+                               accept=lambda item: detail_difference(detail, item[1]) <= max_difference)
+        if nearest:
+            match_distance, ((canonical_filename, canonical_page), _) = nearest
+            matches[key] = Match('duplicate', canonical_filename, canonical_page, match_distance)
+        else:
+            tree.add(value, (key, detail))
+    return matches
+
+def assign_duplicates(conn: sqlite3.Connection, distance: int = DUPLICATE_DISTANCE, blank_ink: float = BLANK_INK,
+                      max_difference: float = MAX_DETAIL_DIFFERENCE) -> Dict[str, int]:
+    """Re-group the whole index and store each page's classification"""
+    rows = _load_hashes(conn)
+    matches = classify(rows, distance, blank_ink, max_difference)
+    with conn:
+        conn.execute("update page_hash set kind = 'unique', canonical_filename = null, canonical_page = null, distance = null")
+        conn.executemany(
+            "update page_hash set kind = ?, canonical_filename = ?, canonical_page = ?, distance = ? "
+            "where filename = ? and page_number = ?",
+            [(*match, *key) for key, match in matches.items()],
+        )
+    return {
+        'pages': len(rows),
+        'blank': sum(match.kind == 'blank' for match in matches.values()),
+        'duplicate': sum(match.kind == 'duplicate' for match in matches.values()),
+    }
+
+class PageDeduplicator:
+    """Read-only view of the index for the OCR workers"""
+
+    def __init__(self, path: Path = HASH_DB_PATH):
+        conn = connect(path)
+        self._matches = {
+            (row['filename'], row['page_number']): Match(row['kind'], row['canonical_filename'],
+                                                         row['canonical_page'], row['distance'])
+            for row in conn.execute("select * from page_hash where kind in ('blank', 'duplicate')")
+        }
+        conn.close()
+
+    def lookup(self, filename: str, page_number: int) -> Optional[Match]:
+        """The page's Match if it is blank or a duplicate, otherwise None"""
+        return self._matches.get((filename, int(page_number)))
+
+    def __len__(self):
+        return len(self._matches)
+
+def show_report(conn: sqlite3.Connection):
+    total, blank, duplicate = conn.execute("""
+        select count(*),
+               coalesce(sum(kind = 'blank'), 0),
+               coalesce(sum(kind = 'duplicate'), 0)
+        from page_hash
+    """).fetchone()
+    saved = blank + duplicate
+    print(f"Pages indexed: {total}")
+    print(f"Blank pages: {blank}")
+    print(f"Near-duplicate pages: {duplicate}")
+    if total:
+        print(f"Gemini calls saved: {saved} ({saved / total:.1%})")
+
+    print("\nMost repeated pages:")
+    for row in conn.execute("""
+        select canonical_filename, canonical_page, count(*) as copies
+        from page_hash where kind = 'duplicate'
+        group by canonical_filename, canonical_page
+        order by copies desc limit 10
+    """):
+        print(f"  {row['canonical_filename']} p{row['canonical_page']}: {row['copies']} copies")
+
+def _transcriptions() -> Dict[Tuple[str, int], str]:
+    """Non-error transcriptions from the local mirror, without syncing it"""
+    import mirror
+    if not mirror.MIRROR_PATH.exists():
+        return {}
+    conn = mirror.connect()
+    rows = conn.execute("""
+        select issue.filename, page.page_number, page.ocr_result
+        from page join issue on issue.id = page.parent_issue_id
+        where not page.error and page.page_number glob '[0-9]*'
+    """).fetchall()
+    conn.close()
+    return {(filename, int(page_number)): text or '' for filename, page_number, text in rows}
+
+def tune(conn: sqlite3.Connection, max_distance: int, blank_ink: float,
+         max_difference: float = MAX_DETAIL_DIFFERENCE, same_text: float = 0.9):
+    """Print flagged counts and, where transcriptions exist, text agreement per threshold"""
+    rows = _load_hashes(conn)
+    texts = _transcriptions()
+    if not texts:
+        print("No local mirror found; run `python mirror.py sync` to measure text agreement\n")
+
+    print("Ink coverage of the least inked pages (blank threshold candidates):")
+    for row in sorted(rows, key=lambda row: row['ink'])[:15]:
+        marker = '*' if row['ink'] < blank_ink else ' '
+        print(f"  {marker} {row['ink']:.4f}  {row['filename']} p{row['page_number']}")
+
+    print(f"\n{'distance':>8} {'duplicates':>10} {'checked':>8} {'same text':>10}")
+    for distance in range(0, max_distance + 1, 2):
+        matches = classify(rows, distance, blank_ink, max_difference)
+        duplicates = [(key, match) for key, match in matches.items() if match.kind == 'duplicate']
+        checked = agreed = 0
+        for (filename, page_number), match in duplicates:
+            text = texts.get((filename, page_number))
+            canonical_text = texts.get((match.filename, match.page_number))
+            if text is None or canonical_text is None:
+                continue
+            checked += 1
+            if difflib.SequenceMatcher(None, text, canonical_text).quick_ratio() >= same_text:
+                agreed += 1
+        agreement = f"{agreed / checked:.1%}" if checked else "n/a"
+        print(f"{distance:>8} {len(duplicates):>10} {checked:>8} {agreement:>10}")
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Perceptual-hash deduplication of pages before OCR")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    index_parser = subparsers.add_parser('index', help="hash new pages and regroup the corpus")
+    index_parser.add_argument('--directory', default="WECs")
+    index_parser.add_argument('--distance', type=int, default=DUPLICATE_DISTANCE)
+    index_parser.add_argument('--blank-ink', type=float, default=BLANK_INK)
+    index_parser.add_argument('--max-difference', type=float, default=MAX_DETAIL_DIFFERENCE,
+                              help="largest share of differing detail-hash bits for a duplicate")
+
+    subparsers.add_parser('report', help="how many OCR calls the index saves")
+
+    tune_parser = subparsers.add_parser('tune', help="compare thresholds against existing transcriptions")
+    tune_parser.add_argument('--max-distance', type=int, default=32)
+    tune_parser.add_argument('--blank-ink', type=float, default=BLANK_INK)
+    tune_parser.add_argument('--max-difference', type=float, default=MAX_DETAIL_DIFFERENCE)
+
+    args = parser.parse_args(argv)
+    conn = connect()
+
+    if args.command == 'index':
+        for pdf_path in sorted(Path(args.directory).glob("*.pdf")):
+            hashed = index_pdf(conn, pdf_path)
+            if hashed:
+                print(f"Hashed {hashed} pages of {pdf_path.name}")
+        stats = assign_duplicates(conn, args.distance, args.blank_ink, args.max_difference)
+        print(f"{stats['pages']} pages: {stats['blank']} blank, {stats['duplicate']} near-duplicates")
+    elif args.command == 'report':
+        show_report(conn)
+    elif args.command == 'tune':
+        tune(conn, args.max_distance, args.blank_ink, args.max_difference)
+
+if __name__ == "__main__":
+    main()
@@ -2,7 +2,7 @@ import os
 from pathlib import Path
 from supabase import create_client, Client
 from dotenv import load_dotenv
-import PyPDF2
+import mirror
 
 # Load environment variables and initialize Supabase client
 load_dotenv()
@@ -15,9 +15,9 @@ def get_completion_stats():
     """
     Calculate total pages across all PDFs and database records
     """
-    # Get total pages in database using count aggregation
-    pages = supabase.table('page').select('*', count='exact').execute()
-    db_total_pages = pages.count
+    # Get total pages in database from the local mirror
+    conn = mirror.sync(supabase)
+    db_total_pages = conn.execute("select count(*) from page").fetchone()[0]
     
     # Get total pages across all PDFs
     pdf_total_pages = 0
@@ -27,10 +27,10 @@ def get_completion_stats():
         print("WECs directory not found")
         return
         
+    # Count the PDFs themselves: issue.num_pages can hold a DB page count (see make-pages).
+    # The mirror caches each count until the file changes.
     for pdf_file in pdf_dir.glob("*.pdf"):
-        with open(pdf_file, 'rb') as f:
-            pdf_reader = PyPDF2.PdfReader(f)
-            pdf_total_pages += len(pdf_reader.pages)
+        pdf_total_pages += mirror.pdf_page_count(conn, pdf_file)
     
     # Calculate percentage
     percent_complete = (db_total_pages / pdf_total_pages) * 100
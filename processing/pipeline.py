@@ -0,0 +1,429 @@
+"""
+Single entry point for the ingestion pipeline.
+
+    python pipeline.py status
+    python pipeline.py run [stage ...] [--issue FILENAME ...] [--force]
+    python pipeline.py check | percent | fix-pages
+    python pipeline.py archive {build,page,issue,bench} ...
+    python pipeline.py mirror {sync,stats} ...
+    python pipeline.py dedup {index,report,tune} ...
+    python pipeline.py loadtest {ocr,batch,images,scrape,corpus} ...
+    python pipeline.py deltas {build,verify} ...
+    python pipeline.py batch {prepare,run,status,compare} ...
+
+Stages form a dependency graph:
+
+    download            -> manifest, dedup
+    manifest, dedup     -> ocr
+    ocr                 -> images, embeddings, export, archive
+    images, embeddings  -> publish
+
+Every stage records a fingerprint per issue (or one for the whole corpus) in
+.pipeline-state.json once it finishes, so a run only recomputes issues whose
+inputs changed since the last successful run. Per-issue stages report which
+issues they actually completed (every page stored, every image uploaded, the
+text file written); the rest, and anything built on top of them, stay stale
+and are retried next run. An issue whose dependencies aren't recorded yet is
+not handed to the stage at all, and an issue that raises is left incomplete
+without stopping the others. Corpus-wide stages remember which recorded
+dependency fingerprints they last ran on, so while one issue keeps failing
+upstream they don't rerun until something else upstream changes.
+
+`download` has no local inputs, so instead it goes stale PIPELINE_DOWNLOAD_TTL
+seconds (default one day) after it last finished; new PDFs it fetches then
+make their own issues stale downstream. `run download --force` checks the
+site right away.
+
+The standalone scripts import Selenium, google.generativeai, pdf2image and
+create API clients at import time, so they are only loaded when a stage or
+tool that needs them actually runs. `status` never touches them.
+"""
+import time
+
+_START = time.perf_counter()
+
+import argparse
+import hashlib
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+HERE = Path(__file__).resolve().parent
+STATE_PATH = Path(".pipeline-state.json")
+PDF_DIR = Path("WECs")
+OUTPUT_DIR = Path("OCR-results")
+ARCHIVE_PATH = Path("fulltext.wetx")
+
+# Key used for stages that run once over the whole corpus
+CORPUS = "*"
+# State entry holding when each stage with a ttl last finished
+FINISHED_AT = "_finished_at"
+DOWNLOAD_TTL = float(os.getenv('PIPELINE_DOWNLOAD_TTL', str(24 * 3600)))
+# State entry holding the recorded inputs each corpus-wide stage last ran on
+RAN_ON = "_ran_on"
+
+# Seconds spent loading each script, filled in by load_script
+import_times: Dict[str, float] = {}
+_modules: Dict[str, object] = {}
+
+def load_script(filename: str):
+    """Import one of the processing scripts by filename, timing the import"""
+    if filename in _modules:
+        return _modules[filename]
+
+    start = time.perf_counter()
+    module_name = Path(filename).stem.replace('-', '_')
+    spec = importlib.util.spec_from_file_location(module_name, HERE / filename)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    import_times[filename] = time.perf_counter() - start
+
+    _modules[filename] = module
+    return module
+
+@dataclass
+class Stage:
+    name: str
+    # Per-issue stages return the filenames they completed; anything else is retried next run
+    run: Callable[[List[Path]], Optional[List[str]]]
+    deps: List[str] = field(default_factory=list)
+    per_issue: bool = False
+    # Bump to force every issue through the stage again after a logic change
+    version: int = 1
+    # Seconds after which a finished corpus-wide stage is stale even if its inputs aren't
+    ttl: Optional[float] = None
+
+def run_download(issues: List[Path]):
+    """Scrape wholeearth.info and download every PDF"""
+    load_script('scrape-and-download.py').main()
+
+def run_manifest(issues: List[Path]):
+    """Refresh issue metadata and fill in missing page counts"""
+    # Both scripts walk the whole corpus; new PDFs are what make this stage stale
+    load_script('issue-metadata.py').update_issue_metadata()
+    load_script('fix-page-numbers.py').fix_page_numbers()
+
+def run_dedup(issues: List[Path]):
+    """Hash the given issues' pages, then regroup blank and duplicate pages corpus-wide"""
+    dedup = load_script('page_dedup.py')
+    conn = dedup.connect()
+    for pdf_path in issues:
+        dedup.index_pdf(conn, pdf_path)
+    stats = dedup.assign_duplicates(conn)
+    print(f"{stats['pages']} pages hashed: {stats['blank']} blank, {stats['duplicate']} near-duplicates")
+
+def completed_issues(process_pdf: Callable[[Path], bool], issues: List[Path]) -> List[str]:
+    """Filenames of the issues process_pdf finished; one that raises is left for the next run"""
+    completed = []
+    for pdf_path in issues:
+        try:
+            if process_pdf(pdf_path):
+                completed.append(pdf_path.name)
+        except Exception as e:
+            print(f"Error processing {pdf_path.name}: {e}")
+    return completed
+
+def run_ocr(issues: List[Path]) -> List[str]:
+    """OCR every page of the given issues with Gemini"""
+    ocr = load_script('gemini_page_ocr.py')
+    return completed_issues(lambda pdf_path: ocr.process_pdf(str(pdf_path)), issues)
+
+def run_images(issues: List[Path]) -> List[str]:
+    """Upload page images for the given issues to Cloudinary"""
+    images = load_script('upload-images.py')
+    return completed_issues(images.process_pdf, issues)
+
+def run_embeddings(issues: List[Path]):
+    """Embed any pages without an embedding using the frontend's script"""
+    subprocess.run(['node', 'generate-embeddings.js'], cwd=HERE.parent / 'frontend', check=True)
+
+def run_export(issues: List[Path]) -> List[str]:
+    """Rewrite the concatenated text dump for the given issues"""
+    def output_path(pdf_path):
+        return OUTPUT_DIR / f"{pdf_path.name.replace('.pdf', '')}.txt"
+
+    # make-pages skips issues whose output already exists, so clear stale ones first
+    for pdf_path in issues:
+        if output_path(pdf_path).exists():
+            output_path(pdf_path).unlink()
+    load_script('make-pages.py').save_concatenated_pages()
+    # Issues whose page counts don't match yet are skipped without an output file
+    return [pdf_path.name for pdf_path in issues if output_path(pdf_path).exists()]
+
+def run_publish(issues: List[Path]):
+    """Publish a new frontend data version with delta packs if anything changed"""
+    packs = load_script('delta_packs.py')
+    packs.build(packs.fetch_tables(), packs.DEFAULT_OUT)
+
+def run_archive(issues: List[Path]):
+    """Rebuild the compressed full-text archive"""
+    archive = load_script('fulltext_archive.py')
+    summary = archive.build_archive(archive.fetch_corpus(), ARCHIVE_PATH)
+    print(f"Archived {summary['pages']} pages into {ARCHIVE_PATH} ({summary['archive_bytes']:,} bytes)")
+
+STAGES: Dict[str, Stage] = {
+    stage.name: stage for stage in [
+        Stage('download', run_download, ttl=DOWNLOAD_TTL),
+        Stage('manifest', run_manifest, deps=['download'], per_issue=True),
+        # v2: sparse pages are no longer grouped as duplicates
+        # v3: blanks are decided by contrast with the paper, duplicates confirmed by a detail hash
+        Stage('dedup', run_dedup, deps=['download'], per_issue=True, version=3),
+        Stage('ocr', run_ocr, deps=['manifest', 'dedup'], per_issue=True),
+        Stage('images', run_images, deps=['ocr'], per_issue=True),
+        Stage('embeddings', run_embeddings, deps=['ocr']),
+        Stage('export', run_export, deps=['ocr'], per_issue=True),
+        Stage('archive', run_archive, deps=['ocr']),
+        Stage('publish', run_publish, deps=['images', 'embeddings']),
+    ]
+}
+
+# Standalone tools that can be run through this CLI: (script, function, forwards_args)
+TOOLS = {
+    'check': ('check-complete.py', 'check_page_counts', False),
+    'percent': ('percent-complete.py', 'get_completion_stats', False),
+    'fix-pages': ('fix-page-numbers.py', 'fix_page_numbers', False),
+    'archive': ('fulltext_archive.py', 'main', True),
+    'mirror': ('mirror.py', 'main', True),
+    'dedup': ('page_dedup.py', 'main', True),
+    'loadtest': ('loadtest.py', 'main', True),
+    'deltas': ('delta_packs.py', 'main', True),
+    'batch': ('batch_ocr.py', 'main', True),
+}
+
+def load_state() -> Dict[str, Dict[str, str]]:
+    """Load recorded stage fingerprints"""
+    if not STATE_PATH.exists():
+        return {}
+    with open(STATE_PATH, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def save_state(state: Dict[str, Dict[str, str]]):
+    """Write recorded stage fingerprints atomically"""
+    tmp_path = STATE_PATH.with_suffix('.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+    tmp_path.replace(STATE_PATH)
+
+def list_issues() -> List[Path]:
+    """All downloaded issue PDFs"""
+    if not PDF_DIR.exists():
+        return []
+    return sorted(PDF_DIR.glob("*.pdf"))
+
+def file_fingerprint(path: Path) -> str:
+    """Cheap content fingerprint for a PDF: size and modification time"""
+    stat = path.stat()
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+def _digest(*parts: str) -> str:
+    return hashlib.sha1('\0'.join(parts).encode('utf-8')).hexdigest()[:16]
+
+def topological_order(names: List[str]) -> List[str]:
+    """The given stages plus everything they depend on, dependencies first"""
+    order = []
+    def visit(name):
+        if name in order:
+            return
+        for dep in STAGES[name].deps:
+            visit(dep)
+        order.append(name)
+    for name in names:
+        visit(name)
+    return order
+
+def expected_fingerprints(issues: List[Path]) -> Dict[str, Dict[str, str]]:
+    """
+    Fingerprint every stage would record if it were brought up to date now.
+    A stage's fingerprint covers its version, the issue PDF (for per-issue
+    stages) and the fingerprints of the stages it depends on.
+    """
+    inputs = {pdf_path.name: file_fingerprint(pdf_path) for pdf_path in issues}
+    expected: Dict[str, Dict[str, str]] = {}
+
+    for name in topological_order(list(STAGES)):
+        stage = STAGES[name]
+
+        def dep_parts(key):
+            parts = []
+            for dep in stage.deps:
+                dep_prints = expected[dep]
+                if STAGES[dep].per_issue and key == CORPUS:
+                    parts.extend(f"{k}={v}" for k, v in sorted(dep_prints.items()))
+                elif STAGES[dep].per_issue:
+                    parts.append(dep_prints[key])
+                else:
+                    parts.append(dep_prints[CORPUS])
+            return parts
+
+        if stage.per_issue:
+            expected[name] = {
+                key: _digest(name, str(stage.version), fingerprint, *dep_parts(key))
+                for key, fingerprint in inputs.items()
+            }
+        else:
+            expected[name] = {CORPUS: _digest(name, str(stage.version), *dep_parts(CORPUS))}
+
+    return expected
+
+def stale_keys(name: str, expected, state) -> List[str]:
+    """Issues (or CORPUS) whose recorded fingerprint differs from the expected one"""
+    recorded = state.get(name, {})
+    ttl = STAGES[name].ttl
+    if ttl is not None and time.time() - state.get(FINISHED_AT, {}).get(name, 0) > ttl:
+        return list(expected[name])
+    return [key for key, fingerprint in expected[name].items() if recorded.get(key) != fingerprint]
+
+def deps_recorded(name: str, key: str, expected, state) -> bool:
+    """Whether every dependency of a stage is recorded up to date for this key"""
+    for dep in STAGES[name].deps:
+        recorded = state.get(dep, {})
+        if STAGES[dep].per_issue and key == CORPUS:
+            keys = list(expected[dep])
+        else:
+            keys = [key if STAGES[dep].per_issue else CORPUS]
+        if any(recorded.get(dep_key) != expected[dep][dep_key] for dep_key in keys):
+            return False
+    return True
+
+def recorded_inputs(name: str, state) -> str:
+    """Digest of the dependency fingerprints recorded so far, which a corpus-wide stage runs on"""
+    parts = [name, str(STAGES[name].version)]
+    for dep in STAGES[name].deps:
+        parts.extend(f"{dep}:{key}={value}" for key, value in sorted(state.get(dep, {}).items()))
+    return _digest(*parts)
+
+def show_status(args):
+    """Print how many issues each stage still has to process"""
+    issues = list_issues()
+    expected = expected_fingerprints(issues)
+    state = load_state()
+
+    print(f"{len(issues)} issue PDFs in {PDF_DIR}/")
+    for name in topological_order(list(STAGES)):
+        stale = stale_keys(name, expected, state)
+        total = len(expected[name])
+        if not stale:
+            print(f"✓ {name}: up to date")
+        elif STAGES[name].per_issue:
+            print(f"  {name}: {len(stale)}/{total} issues need processing")
+        else:
+            print(f"  {name}: needs to run")
+        if args.verbose and STAGES[name].per_issue:
+            for key in stale:
+                print(f"      {key}")
+
+    print(f"Status computed in {(time.perf_counter() - _START) * 1000:.0f} ms")
+
+def run_stages(args):
+    """Bring the requested stages (and their dependencies) up to date"""
+    names = args.stages or list(STAGES)
+    unknown = [name for name in names if name not in STAGES]
+    if unknown:
+        print(f"Unknown stage(s): {', '.join(unknown)}")
+        sys.exit(2)
+    order = names if args.only else topological_order(names)
+
+    wanted = set(args.issue or [])
+
+    for name in order:
+        stage = STAGES[name]
+        # Fingerprint inside the loop: the download stage is what creates the PDFs
+        issues = list_issues()
+        expected = expected_fingerprints(issues)
+        state = load_state()
+
+        todo = list(expected[name]) if args.force else stale_keys(name, expected, state)
+        if stage.per_issue and wanted:
+            todo = [key for key in todo if key in wanted]
+        if stage.per_issue:
+            # Issues still incomplete upstream wait for their dependencies to finish
+            waiting = [key for key in todo if not deps_recorded(name, key, expected, state)]
+            if waiting:
+                print(f"  {name}: {len(waiting)} issue(s) waiting on {', '.join(stage.deps)}: {', '.join(waiting)}")
+            todo = [key for key in todo if key not in waiting]
+        if not todo:
+            print(f"✓ {name}: up to date")
+            continue
+
+        inputs = recorded_inputs(name, state)
+        if (not stage.per_issue and stage.ttl is None and not args.force
+                and state.get(RAN_ON, {}).get(name) == inputs):
+            print(f"✓ {name}: inputs unchanged since its last run, waiting on {', '.join(stage.deps)}")
+            continue
+
+        if stage.per_issue:
+            print(f"\n=== {name}: {len(todo)} issue(s) ===")
+            completed = stage.run([PDF_DIR / key for key in todo])
+        else:
+            print(f"\n=== {name} ===")
+            completed = stage.run(issues)
+
+        # Only issues the stage reports as complete are recorded as up to date
+        if stage.per_issue and completed is not None:
+            incomplete = [key for key in todo if key not in completed]
+            if incomplete:
+                print(f"  {name}: {len(incomplete)} issue(s) incomplete, will retry: {', '.join(incomplete)}")
+            todo = [key for key in todo if key in completed]
+        # A corpus-wide stage that ran on incomplete dependencies isn't up to date,
+        # but remembers what it ran on so it only reruns once they change
+        todo = [key for key in todo if deps_recorded(name, key, expected, state)]
+
+        state.setdefault(name, {})
+        for key in todo:
+            state[name][key] = expected[name][key]
+        if not stage.per_issue:
+            state.setdefault(RAN_ON, {})[name] = inputs
+        if stage.ttl is not None:
+            state.setdefault(FINISHED_AT, {})[name] = time.time()
+        save_state(state)
+
+    report_import_times()
+
+def run_tool(args):
+    """Run one of the standalone scripts through the CLI"""
+    script, function, forwards_args = TOOLS[args.command]
+    entry = getattr(load_script(script), function)
+    if forwards_args:
+        entry(args.forwarded)
+    else:
+        entry()
+    report_import_times()
+
+def report_import_times():
+    for script, seconds in import_times.items():
+        print(f"Imported {script} in {seconds:.2f}s")
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Whole Earth ingestion pipeline")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    status_parser = subparsers.add_parser('status', help="show which stages are out of date")
+    status_parser.add_argument('-v', '--verbose', action='store_true', help="list stale issues")
+    status_parser.set_defaults(func=show_status)
+
+    run_parser = subparsers.add_parser('run', help="run stages whose inputs changed")
+    run_parser.add_argument('stages', nargs='*', help=f"stages to run ({', '.join(STAGES)}); default all")
+    run_parser.add_argument('--issue', action='append', help="limit to this PDF filename (repeatable)")
+    run_parser.add_argument('--only', action='store_true', help="don't run dependencies first")
+    run_parser.add_argument('--force', action='store_true', help="ignore recorded fingerprints")
+    run_parser.set_defaults(func=run_stages)
+
+    for name, (script, _, forwards_args) in TOOLS.items():
+        # Forwarding tools leave --help and everything else to the script's own parser
+        tool_parser = subparsers.add_parser(name, help=f"run {script}", add_help=not forwards_args)
+        tool_parser.set_defaults(func=run_tool, forwards_args=forwards_args)
+
+    args, forwarded = parser.parse_known_args(argv)
+    if forwarded and not getattr(args, 'forwards_args', False):
+        parser.error(f"unrecognized arguments: {' '.join(forwarded)}")
+    args.forwarded = forwarded
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
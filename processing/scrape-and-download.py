@@ -10,35 +10,42 @@ from urllib.parse import urljoin
 from queue import Queue
 from threading import Thread
 
-# Create WECs directory if it doesn't exist
-if not os.path.exists('WECs'):
-    os.makedirs('WECs')
+MAIN_URL = 'https://wholeearth.info'
+NUM_WORKERS = int(os.getenv('SCRAPE_WORKERS', '3'))  # Number of parallel workers
 
-# Initialize queue for URLs
-url_queue = Queue()
+def create_drivers(num_workers: int = NUM_WORKERS) -> list:
+    """Start a pool of headless Chrome drivers; raises RuntimeError if Chrome won't start"""
+    options = webdriver.ChromeOptions()
+    options.add_argument('--headless')
+    options.add_argument('--no-sandbox')
+    options.add_argument('--disable-dev-shm-usage')
+    options.add_argument('--disable-gpu')
+    options.add_argument('--disable-software-rasterizer')
+    options.add_argument('--ignore-certificate-errors')
+    options.add_argument('--ignore-ssl-errors')
+    options.add_argument('--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36')
 
-# Set up headless Chrome driver
-options = webdriver.ChromeOptions()
-options.add_argument('--headless')
-options.add_argument('--no-sandbox')
-options.add_argument('--disable-dev-shm-usage')
-options.add_argument('--disable-gpu')
-options.add_argument('--disable-software-rasterizer')
-options.add_argument('--ignore-certificate-errors')
-options.add_argument('--ignore-ssl-errors')
-options.add_argument('--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36')
+    drivers = []
+    try:
+        for _ in range(num_workers):
+            drivers.append(webdriver.Chrome(options=options))
+    except Exception as e:
+        for d in drivers:
+            d.quit()
+        raise RuntimeError(f"Error initializing Chrome driver: {str(e)}") from e
+    return drivers
+
+def collect_issue_urls(main_url: str = MAIN_URL) -> list:
+    """Issue page URLs linked from the main page"""
+    response = requests.get(main_url)
+    soup = BeautifulSoup(response.text, 'html.parser')
 
-# Create a driver pool
-NUM_WORKERS = 3  # Number of parallel workers
-drivers = []
-try:
-    for _ in range(NUM_WORKERS):
-        drivers.append(webdriver.Chrome(options=options))
-except Exception as e:
-    print(f"Error initializing Chrome driver: {str(e)}")
-    for d in drivers:
-        d.quit()
-    exit(1)
+    urls = []
+    for tag in soup.find_all('a'):
+        href = tag.get('href')
+        if href and '/p/' in href:  # Only process URLs containing '/p/'
+            urls.append(urljoin(main_url, href))
+    return urls
 
 def process_url(driver, url):
     if '/p/' not in url:
@@ -78,48 +85,52 @@ def process_url(driver, url):
     except Exception as e:
         print(f"Error processing {url}: {str(e)}")
 
-def worker(driver_index):
-    driver = drivers[driver_index]
+def worker(driver, url_queue: Queue):
     while True:
         url = url_queue.get()
+        # One sentinel per worker; the threads are joined, not the queue
         if url is None:
             break
         process_url(driver, url)
-        url_queue.task_done()
         # Reduced sleep time
         time.sleep(1)
 
-# Start multiple worker threads
-worker_threads = []
-for i in range(NUM_WORKERS):
-    thread = Thread(target=worker, args=(i,))
-    thread.start()
-    worker_threads.append(thread)
-
-# Visit main page and collect links
-main_url = 'https://wholeearth.info'
-response = requests.get(main_url)
-soup = BeautifulSoup(response.text, 'html.parser')
-
-# Find all relevant links
-for tag in soup.find_all('a'):
-    href = tag.get('href')
-    if href and '/p/' in href:  # Only process URLs containing '/p/'
-        full_url = urljoin(main_url, href)
-        url_queue.put(full_url)
-        print(f"Added to queue: {full_url}")  # Debug logging
+def main(num_workers: int = NUM_WORKERS):
+    """Download every issue PDF linked from wholeearth.info into WECs/"""
+    # Create WECs directory if it doesn't exist
+    if not os.path.exists('WECs'):
+        os.makedirs('WECs')
 
-# Add sentinel value for each worker
-for _ in range(NUM_WORKERS):
-    url_queue.put(None)
-
-# Wait for all tasks to complete
-url_queue.join()
-for thread in worker_threads:
-    thread.join()
+    drivers = create_drivers(num_workers)
+    url_queue = Queue()
+    try:
+        # Start multiple worker threads
+        worker_threads = []
+        for driver in drivers:
+            thread = Thread(target=worker, args=(driver, url_queue))
+            thread.start()
+            worker_threads.append(thread)
 
-# Clean up all drivers
-for driver in drivers:
-    driver.quit()
+        try:
+            for full_url in collect_issue_urls():
+                url_queue.put(full_url)
+                print(f"Added to queue: {full_url}")  # Debug logging
+        finally:
+            # Add sentinel value for each worker, even if the main page failed
+            for _ in worker_threads:
+                url_queue.put(None)
 
+        # Wait for all tasks to complete
+        for thread in worker_threads:
+            thread.join()
+    finally:
+        # Clean up all drivers
+        for driver in drivers:
+            driver.quit()
 
+if __name__ == "__main__":
+    try:
+        main()
+    except RuntimeError as e:
+        print(str(e))
+        exit(1)
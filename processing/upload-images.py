@@ -27,6 +27,9 @@ supabase: Client = create_client(
     os.getenv('SUPABASE_KEY')
 )
 
+# Pages rendered and uploaded in parallel per issue
+MAX_WORKERS = int(os.getenv('UPLOAD_MAX_WORKERS', '10'))
+
 def upload_page_image(pdf_path: str, page_num: int) -> str:
     """Convert PDF page to image and upload to Cloudinary"""
     thread_name = threading.current_thread().name
@@ -110,29 +113,40 @@ def process_pdfs(directory: str = "WECs"):
         return
         
     for pdf_path in sorted(pdf_dir.glob("*.pdf")):
-        print(f"\nProcessing {pdf_path}")
-        
-        # Get issue ID from database
-        filename = pdf_path.name
-        result = supabase.table('issue').select('id').eq('filename', filename).execute()
-        if not result.data:
-            print(f"Issue not found for {filename}")
-            continue
-            
-        issue_id = result.data[0]['id']
-        
-        # Get all pages for this issue that don't have an image_url
-        pages = supabase.table('page').select('*').eq('parent_issue_id', issue_id).is_('image_url', None).execute()
+        process_pdf(pdf_path)
+
+def process_pdf(pdf_path: Path) -> bool:
+    """Upload images for every page of one PDF that doesn't have an image_url yet; returns True if none are left"""
+    pdf_path = Path(pdf_path)
+    print(f"\nProcessing {pdf_path}")
+    
+    # Get issue ID from database
+    filename = pdf_path.name
+    result = supabase.table('issue').select('id').eq('filename', filename).execute()
+    if not result.data:
+        print(f"Issue not found for {filename}")
+        return False
         
-        # Process pages with thread pool
-        with ThreadPoolExecutor(max_workers=10) as executor:
-            futures = [
-                executor.submit(process_page, pdf_path, page, issue_id)
-                for page in pages.data
-            ]
-            # Wait for all tasks to complete
-            for future in futures:
-                future.result()
+    issue_id = result.data[0]['id']
+    
+    # Get all pages for this issue that don't have an image_url
+    pages = supabase.table('page').select('*').eq('parent_issue_id', issue_id).is_('image_url', None).execute()
+    
+    # Process pages with thread pool
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        futures = [
+            executor.submit(process_page, pdf_path, page, issue_id)
+            for page in pages.data
+        ]
+        # Wait for all tasks to complete
+        for future in futures:
+            future.result()
+    
+    # Failed uploads are only logged, so check what is still missing
+    remaining = supabase.table('page').select('id').eq('parent_issue_id', issue_id).is_('image_url', None).execute()
+    if remaining.data:
+        print(f"{filename}: {len(remaining.data)} pages still without an image")
+    return not remaining.data
 
 if __name__ == "__main__":
     process_pdfs()